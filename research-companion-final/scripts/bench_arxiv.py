@@ -0,0 +1,83 @@
+"""
+Benchmark the arXiv search client against the local stand-in feed server from
+bench_pipeline.py (no network access).
+
+Compares the previous implementation (bare requests.get, ET.fromstring, 0.1 s sleep
+per entry) with query_arxiv cold (new connection, feed fetched) and warm
+(TTL result cache), and checks that all three return the same entries.
+
+Usage (from research-companion-final/):
+    python scripts/bench_arxiv.py [--papers 5] [--feed-entries 30] [--repeat 5]
+"""
+import argparse, json, os, sys, time
+from pathlib import Path
+from urllib.parse import urlencode
+from xml.etree import ElementTree as ET
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_pipeline import start_arxiv_standin
+
+
+def legacy_query(base_url, query, max_results, client_arxiv):
+    """The pre-rewrite search path, kept here only as the baseline."""
+    import requests
+    params = {'search_query': client_arxiv._build_search_query(query), 'start': 0,
+              'max_results': max(max_results * 3, 15), 'sortBy': 'relevance', 'sortOrder': 'descending'}
+    resp = requests.get(base_url + '?' + urlencode(params), timeout=30)
+    resp.raise_for_status()
+    root = ET.fromstring(resp.text)
+    entries = [client_arxiv._parse_entry(e) for e in root.findall(client_arxiv.ATOM + 'entry')]
+    for _ in entries:
+        time.sleep(0.1)
+    return client_arxiv._rerank_by_relevance(entries, query, max_results)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default=str(ROOT / 'artifacts'))
+    ap.add_argument('--papers', type=int, default=5, help='max_results per query')
+    ap.add_argument('--feed-entries', type=int, default=30, help='entries served by the stand-in feed')
+    ap.add_argument('--repeat', type=int, default=5)
+    ap.add_argument('--query', default='sequential recommendation')
+    args = ap.parse_args()
+
+    meta = json.loads((Path(args.artifacts) / 'metadata.json').read_text())['papers']
+    base = list(meta.items())
+    papers = [(f"{pid}-{i}", rec) for i in range(args.feed_entries // max(1, len(base)) + 1)
+              for pid, rec in base][:args.feed_entries]
+    server, base_url = start_arxiv_standin(papers, args.artifacts)
+    feed_url = f"{base_url}/api/query"
+
+    os.environ['ARXIV_MIN_INTERVAL'] = '0'
+    from src.retrieval import client_arxiv
+
+    def timed(fn):
+        t = time.perf_counter()
+        out = fn()
+        return time.perf_counter() - t, out
+
+    try:
+        t_legacy, ref = timed(lambda: legacy_query(feed_url, args.query, args.papers, client_arxiv))
+        cold, warm = [], []
+        for _ in range(args.repeat):
+            client_arxiv._search_cache.clear()
+            secs, out = timed(lambda: client_arxiv.query_arxiv(args.query, args.papers, base_url=feed_url))
+            cold.append(secs)
+            assert out == ref, "query_arxiv output differs from the legacy parser"
+            secs, out = timed(lambda: client_arxiv.query_arxiv(args.query, args.papers, base_url=feed_url))
+            warm.append(secs)
+            assert out == ref
+    finally:
+        server.shutdown()
+
+    print(f"\n{len(papers)} feed entries, max_results={args.papers}")
+    print(f"legacy (sleep per entry)   {t_legacy * 1000:9.1f} ms")
+    print(f"query_arxiv cold, median   {sorted(cold)[len(cold) // 2] * 1000:9.1f} ms")
+    print(f"query_arxiv warm, median   {sorted(warm)[len(warm) // 2] * 1000:9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
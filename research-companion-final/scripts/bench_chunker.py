@@ -0,0 +1,84 @@
+"""
+Chunking benchmark on the PDFs in artifacts/:
+
+  packing   the old accumulate-per-cut loop vs chunker.pack_sentences on the same
+            sentence token counts (isolates the quadratic -> linear change)
+  chunkers  section_chunker's word windows and token-id split vs chunker.sentence_chunker
+            on the kept sections: time, chunk count and how full the chunks are
+
+Usage (from research-companion-final/):
+    python scripts/bench_chunker.py [--artifacts ./artifacts] [--max-tokens 3000] [--overlap 0]
+"""
+import argparse, glob, os, statistics, sys, time
+from itertools import accumulate
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.parsing.cleaner import extract_clean_text
+from src.parsing.sectioner import naive_section_split
+from src.chunking.tokenizer import count_tokens_batch
+from src.chunking.section_chunker import split_kept_sections, chunk_sections
+from src.chunking.chunker import get_nlp, split_sentences, pack_sentences, sentence_chunker
+
+
+def legacy_cuts(token_sizes, max_tokens):
+    """Cut points of the previous chunk_text_by_tokens (re-accumulates the tail at every cut)."""
+    cum = list(accumulate(token_sizes))
+    cuts = [0]
+    for i, total in enumerate(cum):
+        if total > max_tokens:
+            cuts.append(i)
+            cum = list(accumulate(token_sizes[i:]))
+    cuts.append(len(token_sizes))
+    return cuts
+
+
+def timed(fn, *args, **kwargs):
+    t = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t
+
+
+def fill(chunks, max_tokens):
+    return round(statistics.fmean(min(c['tokens'], max_tokens) / max_tokens for c in chunks), 3) if chunks else 0.0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    ap.add_argument('--max-tokens', type=int, default=3000)
+    ap.add_argument('--overlap', type=int, default=0)
+    args = ap.parse_args()
+    paths = sorted(glob.glob(os.path.join(args.artifacts, '*.pdf')))
+
+    docs = []
+    for p in paths:
+        text = '\n'.join(s['text'] for s in naive_section_split(extract_clean_text(p)))
+        docs.append(split_kept_sections(text))
+
+    _, load = timed(get_nlp)
+    print(f"sentence segmenter load: {load:.2f} s")
+
+    # whole document as one sentence stream: worst case for the old cut loop
+    sents = [s for doc in docs for s in split_sentences(['\n'.join(sec['text'] for sec in doc)])[0]]
+    sizes = count_tokens_batch(sents)
+    for budget in (200, 1000, args.max_tokens):
+        _, old = timed(legacy_cuts, sizes, budget)
+        _, new = timed(pack_sentences, sizes, budget, 0)
+        print(f"packing {len(sents)} sentences at {budget:5d} tokens: legacy {old * 1000:8.1f} ms   "
+              f"linear {new * 1000:6.1f} ms")
+
+    for label, fn in (('words', lambda d: chunk_sections(d, args.max_tokens)),
+                      ('tokens', lambda d: chunk_sections(d, args.max_tokens, 'tokens', args.overlap)),
+                      ('sentence', lambda d: sentence_chunker(d, args.max_tokens, args.overlap))):
+        chunks, secs = timed(lambda: [fn(d) for d in docs])
+        flat = [c for doc in chunks for c in doc]
+        split = [c for c in flat if '(part ' in c['section']]
+        over = sum(c['tokens'] > args.max_tokens for c in flat)
+        print(f"{label:<9}{secs:6.2f} s   {len(flat):4d} chunks   {len(split):4d} split parts   "
+              f"fill(split parts) {fill(split, args.max_tokens):.3f}   over budget {over}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark heuristic_summarize (the no-LLM fallback) on real chunks from
+artifacts/ and on large synthetic / adversarial chunks.
+
+The pre-rewrite implementation is kept below as the baseline; the script reports
+timings for both and how many real chunks extract different fields.
+
+Usage (from research-companion-final/):
+    python scripts/bench_heuristic.py [--artifacts ./artifacts] [--repeat 3]
+"""
+import argparse, glob, os, re, sys, time
+from pathlib import Path
+from typing import Dict
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.agents.summarizer import heuristic_summarize
+
+
+def legacy_heuristic_summarize(text: str, chunk_id: str) -> Dict:
+    """heuristic_summarize before the compiled rewrite (baseline only)."""
+    sents = re.split(r'(?<=[.!?])\s+', text.strip())
+
+    # ---------- PROBLEM ----------
+    problem = sents[0] if sents else ''
+
+    # ---------- METHODS ----------
+    methods = []
+    method_patterns = [
+        r'we (?:propose|present|introduce|develop|design) ([\w\- ]+)',
+        r'our (?:method|model|approach|framework|algorithm) ([\w\- ]+)',
+        r'the proposed ([\w\- ]+)',
+    ]
+
+    for pat in method_patterns:
+        for m in re.findall(pat, text, re.I):
+            methods.append(m.strip())
+
+    methods = list(set(methods))
+
+    # ---------- DATASETS (auto-detect) ----------
+    dataset_patterns = [
+        r'on the ([A-Z][A-Za-z0-9\- ]+ dataset)',
+        r'evaluated on ([A-Z][A-Za-z0-9\- ]+)',
+        r'tested on ([A-Z][A-Za-z0-9\- ]+)',
+        r'using the ([A-Z][A-Za-z0-9\- ]+)',
+        r'we use ([A-Z][A-Za-z0-9\- ]+)',
+    ]
+
+    datasets = set()
+    for pat in dataset_patterns:
+        for match in re.findall(pat, text):
+            datasets.add(match.strip())
+
+    # ---------- RESULTS (metric extraction) ----------
+    results = {}
+    result_patterns = [
+        r'(accuracy|acc|f1-score|bleu|rouge|ndcg|map|recall|precision)[:= ]+([0-9]+(?:\.[0-9]+)?)',
+        r'([0-9]+(?:\.[0-9]+)?)\s*%(?:\s+)?(accuracy|acc|f1|f1-score|precision|recall)',
+        r'outperform(?:s)? .* by ([0-9]+(?:\.[0-9]+)?)%',
+    ]
+
+    for pat in result_patterns:
+        for m in re.findall(pat, text, re.I):
+            if isinstance(m, tuple):
+                metric = m[0].lower()
+                value = m[1]
+                results[metric] = value
+    # ---------- LIMITATIONS ----------
+    limitations = []
+    limitation_patterns = [
+        r'limitation[s]?:? (.*?)[\.\n]',
+        r'however[,]?(.*?)[\.\n]',
+        r'drawback[s]?:? (.*?)[\.\n]',
+        r'future work (.*?)[\.\n]',
+    ]
+
+    for pat in limitation_patterns:
+        for m in re.findall(pat, text, re.I):
+            limitations.append(m.strip())
+
+    # ---------- EVIDENCE ----------
+    evidence = {}
+
+    if len(problem.split()) > 5:
+        evidence['problem'] = [{
+            'chunk_id': chunk_id,
+            'snippet': ' '.join(problem.split()[:25])
+        }]
+
+    if methods:
+        evidence['methods'] = [{
+            'chunk_id': chunk_id,
+            'snippet': methods[0]
+        }]
+
+    if datasets:
+        evidence['datasets'] = [{
+            'chunk_id': chunk_id,
+            'snippet': d
+        } for d in list(datasets)[:3]]
+
+    if results:
+        for k, v in list(results.items())[:3]:
+            evidence.setdefault("results", []).append({
+                'chunk_id': chunk_id,
+                'snippet': f"{k}: {v}"
+            })
+
+    if limitations:
+        evidence['limitations'] = [{
+            'chunk_id': chunk_id,
+            'snippet': limitations[0][:100]
+        }]
+
+    return {
+        'problem': problem[:400],
+        'methods': methods,
+        'datasets': list(datasets),
+        'results': results,
+        'limitations': limitations[:3],
+        'evidence': evidence,
+    }
+
+
+def real_chunks(artifacts):
+    from src.parsing.pdf_extractor import extract_text_from_pdf
+    from src.parsing.cleaner import clean_text
+    from src.chunking.section_chunker import section_chunker
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(artifacts, '*.pdf'))):
+        chunks += [c['text'] for c in section_chunker(clean_text(extract_text_from_pdf(path)), max_tokens=3000)]
+    return chunks
+
+
+def synthetic_chunks():
+    sentence = ("We propose DeepRec, a graph model. Evaluated on MovieLens and tested on Amazon Books. "
+                "Our model achieves accuracy: 91.2 and 88.5% recall, however training is slow. ")
+    no_stops = ' '.join(['the proposed outperforms however limitation'] * 4000)   # no sentence ends
+    return {
+        'typical x1': sentence * 60,
+        'long x10': sentence * 600,
+        'unpunctuated': no_stops,
+        'outperform chain': ('outperforms baseline ' * 5000) + 'by 5%',
+    }
+
+
+def compare(old: Dict, new: Dict):
+    """Fields whose content differs (set-wise where the old code returned hash-ordered sets)."""
+    diffs = []
+    if set(old['methods']) != set(new['methods']):
+        diffs.append('methods')
+    if set(old['datasets']) != set(new['datasets']):
+        diffs.append('datasets')
+    # old pattern 2 stored {value: metric}; compare only the metric-keyed entries
+    old_results = {k: v for k, v in old['results'].items() if not re.match(r'[0-9]', k)}
+    if any(new['results'].get(k) != v for k, v in old_results.items()):
+        diffs.append('results')
+    if old['limitations'] != new['limitations']:
+        diffs.append('limitations')
+    if old['problem'] != new['problem']:
+        diffs.append('problem')
+    return diffs
+
+
+def timed(fn, texts, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        t = time.perf_counter()
+        for i, text in enumerate(texts):
+            fn(text, f'c{i}')
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    chunks = real_chunks(args.artifacts)
+    chars = sum(map(len, chunks))
+    t_old = timed(legacy_heuristic_summarize, chunks, args.repeat)
+    t_new = timed(heuristic_summarize, chunks, args.repeat)
+    diffs = {}
+    for i, text in enumerate(chunks):
+        for field in compare(legacy_heuristic_summarize(text, 'c'), heuristic_summarize(text, 'c')):
+            diffs[field] = diffs.get(field, 0) + 1
+    print(f"real chunks: {len(chunks)} ({chars / 1e6:.2f} Mchar)")
+    print(f"  legacy   {t_old * 1000:9.1f} ms")
+    print(f"  compiled {t_new * 1000:9.1f} ms   ({t_old / t_new:.1f}x)")
+    print(f"  chunks with differing fields: {diffs or 'none'}")
+
+    print("synthetic:")
+    for name, text in synthetic_chunks().items():
+        t_old = timed(legacy_heuristic_summarize, [text], 1)
+        t_new = timed(heuristic_summarize, [text], args.repeat)
+        print(f"  {name:<18} {len(text):>8} chars   legacy {t_old * 1000:9.1f} ms   compiled {t_new * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Local index benchmark: ingest the PDFs in artifacts/ (chunked as the pipeline does,
+replicated under fresh ids up to --papers) into a LocalIndex in a temp dir, then time
+queries against the memory-mapped arrays, first in-process and then after a reload.
+
+Usage (from research-companion-final/):
+    PDF_EXTRACT_PROCESSES=0 python scripts/bench_local_index.py [--papers 500] [--queries 200]
+"""
+import argparse, glob, os, random, shutil, statistics, sys, tempfile, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.parsing.cleaner import extract_clean_text
+from src.parsing.sectioner import naive_section_split
+from src.chunking.section_chunker import section_chunker
+from src.retrieval.local_index import LocalIndex, _TERM_RE
+
+QUERIES = ['graph neural network recommendation', 'dropout regularization', 'contrastive learning',
+           'large language model retrieval', 'speech vocoder gan', 'evaluation metrics ranking',
+           'sequential recommendation transformer', 'knowledge distillation']
+
+
+def pct(values, p):
+    vs = sorted(values)
+    return vs[min(len(vs) - 1, int(round(p / 100 * (len(vs) - 1))))]
+
+
+def time_queries(index, queries, max_results):
+    samples = []
+    for q in queries:
+        t = time.perf_counter()
+        index.search(q, max_results=max_results)
+        samples.append((time.perf_counter() - t) * 1000)
+    return samples
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    ap.add_argument('--papers', type=int, default=500)
+    ap.add_argument('--queries', type=int, default=200)
+    ap.add_argument('--max-results', type=int, default=5)
+    args = ap.parse_args()
+
+    corpus = []
+    for p in sorted(glob.glob(os.path.join(args.artifacts, '*.pdf'))):
+        text = '\n'.join(s['text'] for s in naive_section_split(extract_clean_text(p)))
+        corpus.append((Path(p).stem, section_chunker(text)))
+    vocab = sorted({w for _, chunks in corpus for c in chunks for w in _TERM_RE.findall(c['text'].lower())})
+    rng = random.Random(0)
+    queries = [rng.choice(QUERIES) if i % 2 else ' '.join(rng.sample(vocab, 3)) for i in range(args.queries)]
+
+    root = tempfile.mkdtemp(prefix='rc-index-')
+    try:
+        index = LocalIndex(root)
+        adds = []
+        for i in range(args.papers):
+            name, chunks = corpus[i % len(corpus)]
+            paper = {'paper_id': f'{name}-{i}', 'title': name, 'chunk_summaries': [], 'paper_summary': {}}
+            t = time.perf_counter()
+            index.add_paper(paper, chunks)
+            adds.append((time.perf_counter() - t) * 1000)
+        size = sum(f.stat().st_size for f in Path(root).iterdir())
+        print(f"indexed {index.stats()}  on disk {size / 2**20:.1f} MB  "
+              f"add p50 {statistics.median(adds):.2f} ms  p99 {pct(adds, 99):.2f} ms")
+
+        for label, idx in (('warm', index), ('reloaded', LocalIndex(root))):
+            ms = time_queries(idx, queries, args.max_results)
+            print(f"query {label:<9} p50 {statistics.median(ms):6.2f} ms   p99 {pct(ms, 99):6.2f} ms   "
+                  f"max {max(ms):6.2f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark text normalization (header/footer removal, citation and whitespace
+cleanup) on the PDFs in artifacts/ and on long synthetic documents made by
+repeating their pages.
+
+Compares the whole-document path, clean_text(_pages_to_text(pages)), with the
+page-streamed one, ' '.join(normalize_pages(iter_without_headers_footers(pages))).
+It reports CPU time and tracemalloc peak above the input pages, and checks that
+both paths give the same output.
+
+Usage (from research-companion-final/):
+    python scripts/bench_normalize.py [--artifacts ./artifacts] [--pages 100 400]
+"""
+import argparse, glob, os, sys, time, tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.parsing.pdf_extractor import extract_text_by_page, iter_without_headers_footers, _pages_to_text
+from src.parsing.cleaner import clean_text, normalize_pages
+
+
+def whole_document(pages):
+    return clean_text(_pages_to_text(pages))
+
+
+def streamed(pages):
+    return ' '.join(normalize_pages(iter_without_headers_footers(pages)))
+
+
+def measure(fn, pages):
+    tracemalloc.start()
+    t = time.perf_counter()
+    out = fn(pages)
+    secs = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return out, secs, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    ap.add_argument('--pages', type=int, nargs='*', default=[100, 400], help='synthetic document lengths')
+    args = ap.parse_args()
+
+    docs = [extract_text_by_page(p) for p in sorted(glob.glob(os.path.join(args.artifacts, '*.pdf')))]
+    all_pages = [pg for d in docs for pg in d]
+    cases = [(f"{len(docs)} real papers", docs)]
+    for n in args.pages:
+        cases.append((f"synthetic {n} pages", [(all_pages * (n // len(all_pages) + 1))[:n]]))
+
+    print(f"{'case':<22}{'path':<16}{'seconds':>9}{'peak MB':>10}")
+    for name, case_docs in cases:
+        outs = {}
+        for label, fn in (('whole-document', whole_document), ('streamed', streamed)):
+            secs = peak = 0.0
+            outs[label] = []
+            for pages in case_docs:
+                out, s, p = measure(fn, pages)
+                outs[label].append(out)
+                secs += s
+                peak = max(peak, p)
+            print(f"{name:<22}{label:<16}{secs:9.3f}{peak / 2**20:10.2f}")
+        assert outs['whole-document'] == outs['streamed'], f"outputs differ for {name}"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Offline end-to-end benchmark of Orchestrator.run over the PDFs in artifacts/.
+
+Nothing leaves the machine:
+  - arXiv is replaced by a local HTTP server that serves an Atom feed (and the PDFs)
+    built from artifacts/metadata.json,
+  - Gemini is replaced by a deterministic stub with configurable latency.
+
+Reports per-stage latency distributions, papers/minute, peak memory and LLM call
+counts as JSON, so runs can be diffed between commits.
+
+Usage (from research-companion-final/):
+    python scripts/bench_pipeline.py --papers 5 --runs 3 --llm-latency 0.2 --out bench.json
+"""
+import argparse, hashlib, json, os, random, resource, shutil, statistics, sys, tempfile
+import threading, time, tracemalloc
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+ATOM_ENTRY = """  <entry>
+    <id>{id}</id>
+    <published>{published}</published>
+    <title>{title}</title>
+    <summary>{summary}</summary>
+    <author><name>Benchmark Author</name></author>
+    <link href="{pdf_url}" rel="related" type="application/pdf" title="pdf"/>
+  </entry>
+"""
+
+
+def build_feed(papers, base_url):
+    entries = []
+    for i, (pid, rec) in enumerate(papers):
+        entries.append(ATOM_ENTRY.format(
+            id=escape(pid),
+            published=f"{2015 + i % 9}-01-01T00:00:00Z",
+            title=escape(rec.get('title') or pid),
+            summary=escape(f"Abstract of {rec.get('title') or pid}."),
+            pdf_url=escape(f"{base_url}/pdf/{Path(rec['local_path']).name}"),
+        ))
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<feed xmlns="http://www.w3.org/2005/Atom">\n' + ''.join(entries) + '</feed>\n')
+
+
+def start_arxiv_standin(papers, artifacts_dir):
+    """Serve /api/query (Atom feed, same for every query) and /pdf/<file> on a free port."""
+    state = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.startswith('/api/query'):
+                body = state['feed'].encode('utf-8')
+                ctype = 'application/atom+xml'
+            elif self.path.startswith('/pdf/'):
+                f = Path(artifacts_dir) / Path(self.path[5:]).name
+                if not f.exists():
+                    self.send_error(404)
+                    return
+                body = f.read_bytes()
+                ctype = 'application/pdf'
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', ctype)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    state['feed'] = build_feed(papers, base_url)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
+
+
+class StubLLM:
+    """Deterministic Gemini stand-in: response depends only on the prompt; latency is seeded by it too."""
+
+    def __init__(self, latency: float, jitter: float):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def kind(prompt: str) -> str:
+        if 'verification agent' in prompt:
+            return 'evaluate'
+        if 'ranking agent' in prompt:
+            return 'rank'
+        if 'research gaps' in prompt:
+            return 'gaps'
+        if 'scientific editor' in prompt:
+            return 'paper_summary'
+        if '### CHUNK ' in prompt:
+            return 'summarize_batch'
+        return 'summarize'
+
+    def _delay(self, prompt: str) -> float:
+        seed = int(hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:8], 16)
+        return max(0.0, self.latency + random.Random(seed).uniform(-self.jitter, self.jitter))
+
+    def _respond(self, prompt: str) -> str:
+        kind = self.kind(prompt)
+        with self._lock:
+            self.calls[kind] += 1
+        digest = hashlib.sha1(prompt.encode('utf-8')).hexdigest()[:6]
+        summary = {'problem': f'stub problem {digest}', 'methods': [f'method-{digest[:2]}'],
+                   'datasets': ['StubSet'], 'results': {}, 'limitations': [], 'evidence': {}}
+        if kind == 'evaluate':
+            return json.dumps({'ok': True, 'issues': []})
+        if kind == 'summarize_batch':
+            ids = [ln.split('### CHUNK ', 1)[1].strip() for ln in prompt.splitlines() if ln.startswith('### CHUNK ')]
+            return json.dumps([dict(summary, chunk_id=i) for i in ids])
+        if kind == 'gaps':
+            return '### Open Problems\n- stub gap'
+        if kind == 'rank':
+            return 'not json'   # exercises the heuristic ranking fallback
+        return json.dumps(summary)
+
+    def call(self, prompt, max_tokens=512, temperature=0.0):
+        time.sleep(self._delay(prompt))
+        return self._respond(prompt)
+
+    async def acall(self, prompt, max_tokens=512, temperature=0.0):
+        import asyncio
+        await asyncio.sleep(self._delay(prompt))
+        return self._respond(prompt)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    vs = sorted(values)
+
+    def pct(p):
+        return round(vs[min(len(vs) - 1, int(round(p / 100 * (len(vs) - 1))))], 4)
+
+    return {'n': len(vs), 'mean': round(statistics.fmean(vs), 4), 'p50': pct(50), 'p90': pct(90),
+            'p99': pct(99), 'max': round(vs[-1], 4)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default=str(ROOT / 'artifacts'))
+    ap.add_argument('--papers', type=int, default=5, help='max_results per query')
+    ap.add_argument('--runs', type=int, default=3)
+    ap.add_argument('--warmup', type=int, default=1)
+    ap.add_argument('--workers', type=int, default=None, help='Orchestrator max_workers (default: env/config)')
+    ap.add_argument('--verification', choices=['llm', 'tiered'], default=None,
+                    help='Orchestrator verification_mode (default: env/config)')
+    ap.add_argument('--top-k', type=int, default=0, help='relevance filter: LLM-summarized chunks per paper (0 = all)')
+    ap.add_argument('--token-budget', type=int, default=0, help='relevance filter: chunk tokens per paper (0 = no cap)')
+    ap.add_argument('--llm-budget', type=int, default=0, help='LLM prompt + output tokens per query (0 = unlimited)')
+    ap.add_argument('--llm-latency', type=float, default=0.05, help='stub LLM latency in seconds')
+    ap.add_argument('--llm-jitter', type=float, default=0.0)
+    ap.add_argument('--download', action='store_true', help='fetch PDFs from the stand-in server instead of the cache')
+    ap.add_argument('--keep-caches', action='store_true', help='leave LLM / derived-artifact caches enabled')
+    ap.add_argument('--query', default='sequential recommendation')
+    ap.add_argument('--out', default=None, help='write the JSON report here (default: stdout)')
+    args = ap.parse_args()
+
+    meta = json.loads((Path(args.artifacts) / 'metadata.json').read_text())['papers']
+    papers = [(pid, rec) for pid, rec in meta.items()
+              if (Path(args.artifacts) / Path(rec['local_path']).name).exists()]
+    server, base_url = start_arxiv_standin(papers, args.artifacts)
+
+    # configuration has to be in place before the pipeline modules are imported
+    work_dir = tempfile.mkdtemp(prefix='rc-bench-')
+    os.environ['ARXIV_BASE_URL'] = f"{base_url}/api/query"
+    os.environ['ARXIV_MIN_INTERVAL'] = '0'   # local stand-in, no politeness delay needed
+    os.environ['GEMINI_API_KEY'] = 'stub'
+    if not args.keep_caches:
+        os.environ['LLM_CACHE_ENABLED'] = '0'
+        os.environ['DERIVED_CACHE_ENABLED'] = '0'
+        os.environ['ARXIV_CACHE_TTL'] = '0'
+    os.environ['LLM_CACHE_DIR'] = os.path.join(work_dir, 'llm_cache')
+
+    import src.llm.client as llm_client
+    from src.orchestrator.orchestrator import Orchestrator, PAPER_STAGES
+
+    stub = StubLLM(args.llm_latency, args.llm_jitter)
+    llm_client.call_gemini = stub.call
+    llm_client.acall_gemini = stub.acall
+
+    stage_samples = {s: [] for s in PAPER_STAGES + ['retrieval', 'corpus', 'papers_wall']}
+    run_walls, n_papers = [], 0
+    tracemalloc.start()
+    try:
+        for i in range(args.warmup + args.runs):
+            measured = i >= args.warmup
+            tmp_dir = os.path.join(work_dir, f'run{i}')
+            opts = {'max_workers': args.workers, 'verification_mode': args.verification}
+            orc = Orchestrator(tmp_dir=tmp_dir, **{k: v for k, v in opts.items() if v})
+            if not args.download:
+                for pid, rec in papers:
+                    local = str(Path(args.artifacts) / Path(rec['local_path']).name)
+                    orc.meta_store.upsert(pid, dict(rec, local_path=local,
+                                                    pdf_url=f"{base_url}/pdf/{Path(local).name}"))
+            if measured:
+                stub.calls.clear()
+                tracemalloc.reset_peak()
+            t = time.perf_counter()
+            result = orc.run(args.query, max_results=args.papers, chunk_top_k=args.top_k,
+                             chunk_token_budget=args.token_budget, llm_token_budget=args.llm_budget)
+            wall = time.perf_counter() - t
+            if 'error' in result:
+                raise SystemExit(f"pipeline failed: {result}")
+            if not measured:
+                continue
+            run_walls.append(wall)
+            n_papers += len(result['papers'])
+            relevance = result.get('relevance')
+            budget = result.get('llm_budget')
+            escalated = sum(p['verification_stats']['escalated'] for p in result['papers'])
+            saved = sum(p['verification_stats']['llm_calls_saved'] for p in result['papers'])
+            tm = result['timings']
+            for per_paper in tm['per_paper']:
+                for stage in PAPER_STAGES:
+                    stage_samples[stage].append(per_paper.get(stage, 0.0))
+            for key in ('retrieval', 'corpus', 'papers_wall'):
+                stage_samples[key].append(tm[key])
+        _, peak_py = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    total_wall = sum(run_walls)
+    report = {
+        'config': {'papers': args.papers, 'runs': args.runs, 'workers': args.workers,
+                   'verification': args.verification, 'top_k': args.top_k, 'token_budget': args.token_budget,
+                   'llm_budget': args.llm_budget,
+                   'llm_latency': args.llm_latency, 'llm_jitter': args.llm_jitter,
+                   'download': args.download, 'caches': args.keep_caches, 'query': args.query},
+        'runs_seconds': [round(w, 4) for w in run_walls],
+        'run_latency': percentiles(run_walls),
+        'stage_latency': {s: percentiles(v) for s, v in stage_samples.items()},
+        'throughput_papers_per_min': round(n_papers / total_wall * 60, 2) if total_wall else None,
+        'peak_memory': {'python_heap_mb': round(peak_py / 2**20, 2),
+                        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 2)},
+        'llm_calls_last_run': dict(stub.calls),
+        'verification_last_run': {'escalated': escalated, 'llm_calls_saved': saved},
+        'relevance_last_run': relevance,
+        'llm_budget_last_run': budget,
+        'llm_calls_per_paper_last_run': round(sum(stub.calls.values()) / max(1, args.papers), 2),
+    }
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text)
+        print(f"wrote {args.out}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
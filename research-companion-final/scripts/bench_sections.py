@@ -0,0 +1,67 @@
+"""
+Compare the two section extractors on the PDFs in artifacts/:
+
+  text    extract_clean_text -> naive_section_split -> section_chunker
+  layout  extract_layout_sections (font/block headings, stops at References) -> chunk_sections
+
+Reports extraction + chunking time, pages actually read and the tokens handed to
+the summarizer.
+
+Usage (from research-companion-final/):
+    PDF_EXTRACT_PROCESSES=0 python scripts/bench_sections.py [--artifacts ./artifacts]
+"""
+import argparse, glob, os, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import fitz
+from src.parsing.cleaner import extract_clean_text
+from src.parsing.sectioner import naive_section_split
+from src.parsing.layout_extractor import extract_layout_sections, iter_layout_lines
+from src.chunking.section_chunker import section_chunker, chunk_sections
+
+
+def text_mode(path):
+    sections = naive_section_split(extract_clean_text(path))
+    return section_chunker('\n'.join(s['text'] for s in sections))
+
+
+def layout_mode(path):
+    return chunk_sections(extract_layout_sections(path))
+
+
+def pages_read(path):
+    read = 0
+
+    def pages(doc):
+        nonlocal read
+        for page in doc:
+            read += 1
+            yield page
+
+    with fitz.open(path) as doc:
+        for _ in iter_layout_lines(pages(doc)):
+            pass
+        return read, doc.page_count
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    args = ap.parse_args()
+    paths = sorted(glob.glob(os.path.join(args.artifacts, '*.pdf')))
+
+    for label, fn in (('text', text_mode), ('layout', layout_mode)):
+        t = time.perf_counter()
+        chunks = [fn(p) for p in paths]
+        secs = time.perf_counter() - t
+        tokens = sum(c['tokens'] for doc in chunks for c in doc)
+        print(f"{label:<8}{secs:7.2f} s   {sum(map(len, chunks)):4d} chunks   {tokens:8d} tokens")
+
+    read = [pages_read(p) for p in paths]
+    print(f"layout mode read {sum(r for r, _ in read)} of {sum(n for _, n in read)} pages")
+
+
+if __name__ == '__main__':
+    main()
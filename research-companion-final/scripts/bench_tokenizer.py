@@ -0,0 +1,74 @@
+"""
+Micro-benchmark for src/chunking/tokenizer.py over the PDFs in artifacts/.
+
+Compares the old per-call `tiktoken.encoding_for_model` lookup against the cached
+encoder, the batched API and the text-hash memo, and reports tokens/second.
+
+Usage (from research-companion-final/):
+    python scripts/bench_tokenizer.py [--artifacts ./artifacts] [--repeat 3]
+"""
+import argparse, glob, os, sys, time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import tiktoken
+from src.parsing.pdf_extractor import extract_text_from_pdf
+from src.chunking.tokenizer import count_tokens, count_tokens_batch, get_encoding
+
+
+def legacy_count_tokens(text: str, model: str = 'gpt-4o-mini'):
+    # the pre-cache implementation: resolve the encoder on every call
+    try:
+        enc = tiktoken.encoding_for_model(model)
+    except Exception:
+        enc = tiktoken.get_encoding('cl100k_base')
+    return len(enc.encode(text))
+
+
+def load_texts(artifacts: str, piece_chars: int):
+    texts = []
+    for path in sorted(glob.glob(os.path.join(artifacts, '*.pdf'))):
+        try:
+            raw = extract_text_from_pdf(path)
+        except Exception as e:
+            print(f"skip {path}: {e}")
+            continue
+        # section-sized pieces, roughly what section_chunker feeds count_tokens
+        texts.extend(raw[i:i + piece_chars] for i in range(0, len(raw), piece_chars))
+    return texts
+
+
+def bench(label, fn, texts, repeat):
+    best = float('inf')
+    total = 0
+    for _ in range(repeat):
+        t = time.perf_counter()
+        total = fn(texts)
+        best = min(best, time.perf_counter() - t)
+    print(f"{label:<28} {best*1000:9.1f} ms   {total/best:12,.0f} tokens/s")
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--artifacts', default='./artifacts')
+    ap.add_argument('--piece-chars', type=int, default=4000)
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    texts = load_texts(args.artifacts, args.piece_chars)
+    print(f"{len(texts)} pieces, {sum(map(len, texts)):,} chars\n")
+    get_encoding()   # warm the encoder cache so the "after" numbers measure steady state
+
+    before = bench('legacy count_tokens', lambda ts: sum(legacy_count_tokens(t) for t in ts), texts, args.repeat)
+    after = bench('cached count_tokens', lambda ts: sum(count_tokens(t) for t in ts), texts, args.repeat)
+    batch = bench('count_tokens_batch', lambda ts: sum(count_tokens_batch(ts)), texts, args.repeat)
+    count_tokens_batch(texts, memo=True)
+    memo = bench('count_tokens_batch (memo)', lambda ts: sum(count_tokens_batch(ts, memo=True)), texts, args.repeat)
+
+    print(f"\nspeedup vs legacy: cached x{before/after:.1f}, batch x{before/batch:.1f}, memo hit x{before/memo:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,4 +4,6 @@ python3 -m venv .venv
 source .venv/bin/activate
 pip install --upgrade pip
 pip install -r requirements.txt
+# sentence model for CHUNKER=sentence; without it the chunker falls back to spaCy's rule-based sentencizer
+python -m spacy download en_core_web_sm || echo "en_core_web_sm not installed; using the rule-based sentencizer"
 echo "Done. Activate with: source .venv/bin/activate"
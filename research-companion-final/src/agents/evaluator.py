@@ -1,15 +1,103 @@
-import re
-from typing import Dict, List, Tuple
 
-def find_snippet_in_chunks(snippet: str, chunks: List[Dict]) -> Tuple[bool, str]:
+import re
+from typing import Dict, List, Optional, Tuple, Union
+
+_WORD_RE = re.compile(r'\w+')
+_NUMBER_RE = re.compile(r'[-+]?[0-9]*\.?[0-9]+(?:e[-+]?\d+)?')
+_TEXT_RE = re.compile(r'[^\W\d_]{2}')   # two letters in a row: more than a bare number
+
+
+class VerificationIndex:
+    """
+    Per-paper lookup structure for rule-based verification, built once and reused
+    for every chunk and retry of that paper.
+
+    - word -> chunk positions inverted index: a snippet is only searched for in the
+      chunks that contain all of its whole (interior) words, then confirmed with an
+      exact substring find, so results match a linear scan
+    - per-chunk sets of the numbers that occur in the text
+    """
+
+    def __init__(self, chunks: List[Dict]):
+        self.texts = [c.get('text', '') for c in chunks]
+        self.postings: Dict[str, set] = {}
+        self.numbers: List[set] = []
+        for idx, text in enumerate(self.texts):
+            for w in set(_WORD_RE.findall(text)):
+                self.postings.setdefault(w, set()).add(idx)
+            self.numbers.append(set(extract_numbers(text)))
+        self.all_numbers = set().union(*self.numbers) if self.numbers else set()
+
+    def _candidates(self, snippet: str):
+        # first/last words may be cut mid-word by the snippet boundary; only words
+        # bounded by non-word characters inside the snippet are whole words in the chunk too
+        words = [m.group(0) for m in _WORD_RE.finditer(snippet)
+                 if m.start() > 0 and m.end() < len(snippet)]
+        if not words:
+            return range(len(self.texts))
+        postings = sorted((self.postings.get(w, set()) for w in set(words)), key=len)
+        cands = set(postings[0])
+        for p in postings[1:]:
+            if not cands:
+                break
+            cands &= p
+        return sorted(cands)
+
+    def locate(self, snippet: str) -> List[Tuple[str, int]]:
+        """All (chunk_id, char offset of first occurrence) for an exact match of snippet."""
+        if not snippet.strip():
+            return []
+        hits = []
+        for idx in self._candidates(snippet):
+            off = self.texts[idx].find(snippet)
+            if off >= 0:
+                hits.append((f"chunk_{idx}", off))
+        return hits
+
+    def find(self, snippet: str) -> Optional[Tuple[str, int]]:
+        hits = self.locate(snippet)
+        return hits[0] if hits else None
+
+    def has_numbers(self, value) -> bool:
+        """True when value contains at least one number and every one of them occurs in the paper."""
+        nums = extract_numbers(str(value))
+        return bool(nums) and all(n in self.all_numbers for n in nums)
+
+    def find_in(self, idx: int, snippet: str) -> Optional[Tuple[str, int]]:
+        """Like find(), restricted to chunk idx."""
+        if not snippet.strip():
+            return None
+        words = [m.group(0) for m in _WORD_RE.finditer(snippet)
+                 if m.start() > 0 and m.end() < len(snippet)]
+        if any(idx not in self.postings.get(w, ()) for w in words):
+            return None
+        off = self.texts[idx].find(snippet)
+        return (f"chunk_{idx}", off) if off >= 0 else None
+
+    def has_numbers_in(self, idx: int, value) -> bool:
+        """Like has_numbers(), restricted to the numbers of chunk idx."""
+        nums = extract_numbers(str(value))
+        return bool(nums) and all(n in self.numbers[idx] for n in nums)
+
+
+def _as_chunks(chunks: Union[str, List[Dict]]) -> List[Dict]:
+    return [{'text': chunks}] if isinstance(chunks, str) else chunks
+
+
+def find_snippet_in_chunks(snippet: str, chunks: List[Dict],
+                           index: Optional[VerificationIndex] = None) -> Tuple[bool, str]:
     # returns (found, chunk_id) where snippet found (exact substring match)
-    for idx, c in enumerate(chunks):
-        if snippet.strip() and snippet in c.get('text',''):
-            return True, f"chunk_{idx}"
-    return False, ''
+    if index is None:
+        # one-off lookup: a linear scan is cheaper than indexing every chunk
+        for idx, c in enumerate(_as_chunks(chunks)):
+            if snippet.strip() and snippet in c.get('text', ''):
+                return True, f"chunk_{idx}"
+        return False, ''
+    hit = index.find(snippet)
+    return (True, hit[0]) if hit else (False, '')
 
 def extract_numbers(s: str) -> List[float]:
-    nums = re.findall(r'[-+]?[0-9]*\.?[0-9]+(?:e[-+]?\d+)?', s)
+    nums = _NUMBER_RE.findall(s)
     out = []
     for n in nums:
         try:
@@ -18,30 +106,40 @@ def extract_numbers(s: str) -> List[float]:
             continue
     return out
 
-def verify_summary_factuality(summary: Dict, chunks: List[Dict]) -> Dict:
+def verify_summary_factuality(summary: Dict, chunks: Union[str, List[Dict]],
+                              index: Optional[VerificationIndex] = None, chunk_idx: Optional[int] = None) -> Dict:
     # summary: has fields 'problem','methods','datasets','results','evidence'
+    # chunks: chunk dicts (or a single text); pass a prebuilt index to skip re-indexing
+    # chunk_idx: with a paper-wide index, check against that chunk only (chunks is then ignored)
+    if index is None or chunk_idx is None:
+        index = index or VerificationIndex(_as_chunks(chunks))
+        find, has_numbers = index.find, index.has_numbers
+    else:
+        find = lambda s: index.find_in(chunk_idx, s)
+        has_numbers = lambda v: index.has_numbers_in(chunk_idx, v)
     issues = []
+    checked = 0
+    grounded = 0
     # 1) evidence snippets presence
     evidence = summary.get('evidence', {})
     for field, items in evidence.items():
         for it in items:
             snippet = it.get('snippet','').strip()
-            found, cid = find_snippet_in_chunks(snippet, chunks)
-            if not found:
+            checked += 1
+            if find(snippet) is None:
                 issues.append({'type':'missing_evidence', 'field':field, 'snippet': snippet})
+            elif _TEXT_RE.search(snippet):
+                grounded += 1
     # 2) numeric claim verification: ensure numbers mentioned in results appear in chunks
     results = summary.get('results', {})
     for k,v in results.items():
-        # check v appears in chunk text (as number)
-        v_str = str(v)
-        found_any = False
-        for c in chunks:
-            if v_str in c.get('text',''):
-                found_any = True
-                break
-        if not found_any:
+        checked += 1
+        # same number in another notation (0.50 vs 0.5) counts; otherwise the literal text must appear
+        if not (has_numbers(v) or find(str(v)) is not None):
             issues.append({'type':'numeric_mismatch','key':k,'value':v})
-    return {'ok': len(issues)==0, 'issues': issues}
+    # checked: number of claims looked at; ok with checked == 0 means there was nothing to verify
+    # grounded: evidence snippets with text (not just numbers) found verbatim
+    return {'ok': len(issues)==0, 'issues': issues, 'checked': checked, 'grounded': grounded}
 
 import json
 import re
@@ -82,9 +180,10 @@ from src.llm.client import call_llm
 import json
 import re
 
-def evaluate_summary_llm(summary, chunk_text):
+def evaluate_summary_llm(summary, chunk_text, budget=None):
+    # budget: TokenBudget scope; BudgetExceeded propagates so the caller can use the rule-based check
     prompt = build_evaluator_prompt(chunk_text, summary)
-    out = call_llm(prompt, max_tokens=2000, temperature=0)
+    out = call_llm(prompt, max_tokens=2000, temperature=0, budget=budget)
 
     try:
         # Extract the JSON object from LLM output
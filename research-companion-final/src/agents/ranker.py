@@ -81,9 +81,9 @@ import json
 import re
 from src.llm.client import call_llm
 
-def rank_papers_llm(papers: List[Dict]) -> List[Dict]:
+def rank_papers_llm(papers: List[Dict], budget=None) -> List[Dict]:
     prompt = build_ranking_prompt(papers)
-    out = call_llm(prompt, max_tokens=2000, temperature=0)
+    out = call_llm(prompt, max_tokens=2000, temperature=0, budget=budget)
 
     # Extract JSON
     m = re.search(r"\[.*\]", out, flags=re.S)
@@ -73,10 +73,12 @@
 #         evidence['problem'] = [{'chunk_id': chunk_id, 'snippet': ' '.join(problem.split()[:25])}]
 #     return {'problem': problem[:400], 'methods': methods, 'datasets': datasets, 'results': results, 'limitations': limitations, 'evidence': evidence}
 
-import os, json, re
-from typing import Dict, List
-from src.llm.client import call_llm
-from src.chunking.tokenizer import count_tokens
+import os, json, re, asyncio
+from typing import Dict, List, Tuple, Optional
+from src.llm.client import call_llm, acall_llm, run_llm_coroutine, forget_llm_response
+from src.llm.budget import TokenBudget, BudgetExceeded
+from src.chunking.tokenizer import count_tokens, count_tokens_batch, encode_tokens, decode_tokens
+from src.utils.tracing import span
 
 OPENAI_KEY = os.getenv('OPENAI_API_KEY')
 GEMINI_KEY = os.getenv('GEMINI_API_KEY')
@@ -84,6 +86,10 @@ GEMINI_KEY = os.getenv('GEMINI_API_KEY')
 MAX_TOTAL_TOKENS = 4000
 RESP_TOKENS_RESERVED = 400
 
+# batched mode: pack several chunks into one request under this many input tokens (0 = off)
+SUMMARY_BATCH_TOKENS = int(os.getenv('SUMMARY_BATCH_TOKENS', '0'))
+SUMMARY_BATCH_MAX_RESP = int(os.getenv('SUMMARY_BATCH_MAX_RESP', '8192'))   # model output cap
+
 
 # ---------- CHUNK-LEVEL SUMMARIZATION (EXISTING BEHAVIOUR) ----------
 
@@ -97,7 +103,7 @@ def build_prompt(text: str) -> str:
     #     "Do not hallucinate.\n\n"
     #     f"INPUT:\n{text}\n\nOUTPUT:"
     # )
-    prompt = """
+    prompt = f"""
             You are an expert research assistant.
 
             Analyze the following research paper chunk and extract ONLY factual information explicitly stated.
@@ -121,94 +127,74 @@ def build_prompt(text: str) -> str:
 
     return prompt
 
-import re
-from typing import Dict, List
+
+# Heuristic (no-LLM) extraction. One compiled regex per pattern, each run once over the
+# chunk with finditer, so a chunk is scanned a fixed number of times. Patterns are kept
+# apart rather than merged into one alternation per field: each must be free to match
+# text another one already matched, as the original per-pattern findall calls did.
+# Spans are length-bounded so no pattern can run away on long unpunctuated text.
+HEURISTIC_MAX_CHARS = int(os.getenv('HEURISTIC_MAX_CHARS', '100000'))   # input cap
+_SPAN = 200   # longest phrase captured for a method / dataset name
+_CLAUSE = 500   # longest clause captured for a limitation
+
+_SENT_END_RE = re.compile(r'(?<=[.!?])\s+')
+
+_METHOD_RES = [re.compile(p, re.I) for p in (
+    rf'we (?:propose|present|introduce|develop|design) ([\w\- ]{{1,{_SPAN}}})',
+    rf'our (?:method|model|approach|framework|algorithm) ([\w\- ]{{1,{_SPAN}}})',
+    rf'the proposed ([\w\- ]{{1,{_SPAN}}})',
+)]
+
+_DATASET_RES = [re.compile(p) for p in (
+    rf'on the ([A-Z][A-Za-z0-9\- ]{{1,{_SPAN}}} dataset)',
+    rf'evaluated on ([A-Z][A-Za-z0-9\- ]{{1,{_SPAN}}})',
+    rf'tested on ([A-Z][A-Za-z0-9\- ]{{1,{_SPAN}}})',
+    rf'using the ([A-Z][A-Za-z0-9\- ]{{1,{_SPAN}}})',
+    rf'we use ([A-Z][A-Za-z0-9\- ]{{1,{_SPAN}}})',
+)]
+
+# run on the lower-cased text: metric names and numbers are all the groups hold
+_RESULT_RES = [re.compile(p) for p in (
+    r'(?P<m>accuracy|acc|f1-score|bleu|rouge|ndcg|map|recall|precision)[:= ]{1,16}(?P<v>[0-9]+(?:\.[0-9]+)?)',
+    r'(?P<v>[0-9]+(?:\.[0-9]+)?)\s*%\s*(?P<m>accuracy|acc|f1|f1-score|precision|recall)',
+)]
+
+_LIMITATION_RES = [re.compile(p, re.I) for p in (
+    rf'limitation[s]?:? ([^.\n]{{0,{_CLAUSE}}})[.\n]',
+    rf'however[,]?([^.\n]{{0,{_CLAUSE}}})[.\n]',
+    rf'drawback[s]?:? ([^.\n]{{0,{_CLAUSE}}})[.\n]',
+    rf'future work ([^.\n]{{0,{_CLAUSE}}})[.\n]',
+)]
+
+
+def _scan(regexes, text: str) -> List[str]:
+    """Group 1 of every match of each regex in turn (one pass per regex), stripped."""
+    return [m.group(1).strip() for regex in regexes for m in regex.finditer(text)]
 
 
 def heuristic_summarize(text: str, chunk_id: str) -> Dict:
-    sents = re.split(r'(?<=[.!?])\s+', text.strip())
+    text = text.strip()[:HEURISTIC_MAX_CHARS]
 
     # ---------- PROBLEM ----------
-    problem = sents[0] if sents else ''
+    m = _SENT_END_RE.search(text)
+    problem = text[:m.start()] if m else text
 
     # ---------- METHODS ----------
-    methods = []
-    method_patterns = [
-        r'we (?:propose|present|introduce|develop|design) ([\w\- ]+)',
-        r'our (?:method|model|approach|framework|algorithm) ([\w\- ]+)',
-        r'the proposed ([\w\- ]+)',
-    ]
-
-    for pat in method_patterns:
-        for m in re.findall(pat, text, re.I):
-            methods.append(m.strip())
-
-    methods = list(set(methods))
+    # first-seen order (dict) instead of set(): output no longer depends on string hashing
+    methods = list(dict.fromkeys(_scan(_METHOD_RES, text)))
 
     # ---------- DATASETS (auto-detect) ----------
-    dataset_patterns = [
-        r'on the ([A-Z][A-Za-z0-9\- ]+ dataset)',
-        r'evaluated on ([A-Z][A-Za-z0-9\- ]+)',
-        r'tested on ([A-Z][A-Za-z0-9\- ]+)',
-        r'using the ([A-Z][A-Za-z0-9\- ]+)',
-        r'we use ([A-Z][A-Za-z0-9\- ]+)',
-    ]
-
-    datasets = set()
-    for pat in dataset_patterns:
-        for match in re.findall(pat, text):
-            datasets.add(match.strip())
+    datasets = dict.fromkeys(_scan(_DATASET_RES, text))
 
     # ---------- RESULTS (metric extraction) ----------
     results = {}
-    result_patterns = [
-        r'(accuracy|acc|f1-score|bleu|rouge|ndcg|map|recall|precision)[:= ]+([0-9]+(?:\.[0-9]+)?)',
-        r'([0-9]+(?:\.[0-9]+)?)\s*%(?:\s+)?(accuracy|acc|f1|f1-score|precision|recall)',
-        r'outperform(?:s)? .* by ([0-9]+(?:\.[0-9]+)?)%',
-    ]
-
-    for pat in result_patterns:
-        for m in re.findall(pat, text, re.I):
-            if isinstance(m, tuple):
-                metric = m[0].lower()
-                value = m[1]
-                results[metric] = value
-    # ---------- RESULTS (better metric extraction) ----------
-    # results = {}
-
-    # RESULT_PATTERNS = [
-    #     r'(ndcg[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(map[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(recall[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(precision[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(accuracy[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(f1-score[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(hit@k[:= ]+([0-9]+\.[0-9]+))',
-    #     r'(hit@10[:= ]+([0-9]+\.[0-9]+))',
-    #     r'outperform(?:s)? .* by ([0-9]+(?:\.[0-9]+)?)%',
-    #     r'(improve(?:d)? by ([0-9]+(?:\.[0-9]+)?)%)',
-    # ]
-
-    # for pat in RESULT_PATTERNS:
-    #     for m in re.findall(pat, text, re.I):
-    #         if isinstance(m, tuple):
-    #             metric = m[0].split()[0].lower()
-    #             value = m[-1]
-    #             results[metric] = value
-
+    lowered = text.lower()
+    for regex in _RESULT_RES:
+        for m in regex.finditer(lowered):
+            results[m.group('m')] = m.group('v')
 
     # ---------- LIMITATIONS ----------
-    limitations = []
-    limitation_patterns = [
-        r'limitation[s]?:? (.*?)[\.\n]',
-        r'however[,]?(.*?)[\.\n]',
-        r'drawback[s]?:? (.*?)[\.\n]',
-        r'future work (.*?)[\.\n]',
-    ]
-
-    for pat in limitation_patterns:
-        for m in re.findall(pat, text, re.I):
-            limitations.append(m.strip())
+    limitations = _scan(_LIMITATION_RES, text)
 
     # ---------- EVIDENCE ----------
     evidence = {}
@@ -286,33 +272,238 @@ def heuristic_summarize(text: str, chunk_id: str) -> Dict:
 #     }
 
 
-def summarize_chunk(chunk_text: str, chunk_id: str) -> Dict:
-    print("IN Summarize chunk")
+def _trim_tokens(text: str, allowed: int) -> str:
+    """text cut to its first allowed tokens (at least 50); PDF text runs well over a token per word."""
+    ids = encode_tokens([text])[0]
+    return text if len(ids) <= allowed else decode_tokens(ids[:max(50, allowed)])
+
+
+def _template_tokens() -> int:
+    """Tokens build_prompt() adds around the chunk text."""
+    return count_tokens(build_prompt(''), memo=True)
+
+
+def summarize_chunk(chunk_text: str, chunk_id: str, budget: Optional[TokenBudget] = None) -> Dict:
+    """budget: TokenBudget scope to charge; the prompt is trimmed to what it has left."""
+    return summarize_chunk_with_source(chunk_text, chunk_id, budget)[0]
+
+
+def _chunk_request(chunk_text: str, budget: Optional[TokenBudget]) -> Tuple[str, int, int]:
+    """(prompt, max response tokens, prompt tokens) for one chunk, the text trimmed to fit."""
     prompt = build_prompt(chunk_text)
 
     try:
-        prompt_tokens = count_tokens(prompt)
+        prompt_tokens = count_tokens(prompt, memo=True)
     except Exception:
         prompt_tokens = len(prompt.split())
 
     max_resp = max(128, RESP_TOKENS_RESERVED)
-    if prompt_tokens + max_resp > MAX_TOTAL_TOKENS:
-        allowed = MAX_TOTAL_TOKENS - max_resp - 200
-        words = chunk_text.split()
-        chunk_text = ' '.join(words[:max(50, allowed)])
-        prompt = build_prompt(chunk_text)
-
-    out = call_llm(prompt, max_tokens=max_resp, temperature=0.0)
+    max_total = MAX_TOTAL_TOKENS if budget is None else min(MAX_TOTAL_TOKENS, budget.remaining())
+    if prompt_tokens + max_resp > max_total:
+        if max_total < MAX_TOTAL_TOKENS:
+            budget.note_trimmed()   # a summary of part of the chunk must not be cached as the real one
+        allowed = max_total - max_resp - _template_tokens()
+        for _ in range(2):   # tokens can merge differently at the seam; a second cut absorbs that
+            prompt = build_prompt(_trim_tokens(chunk_text, allowed))
+            prompt_tokens = count_tokens(prompt, memo=True)
+            if prompt_tokens + max_resp <= max_total:
+                break
+            allowed -= prompt_tokens + max_resp - max_total
+    return prompt, max_resp, prompt_tokens
+
+
+def _parse_chunk_response(out: Optional[str]) -> Optional[Dict]:
     if out:
         try:
             m = re.search(r'\{.*\}', out, flags=re.S)
             if m:
-                parsed = json.loads(m.group(0))
-                return parsed
+                return json.loads(m.group(0))
         except Exception:
             pass
+    return None
 
-    return heuristic_summarize(chunk_text, chunk_id)
+
+def summarize_chunk_with_source(chunk_text: str, chunk_id: str, budget: Optional[TokenBudget] = None,
+                                use_cache: bool = True) -> Tuple[Dict, str]:
+    """
+    summarize_chunk, plus where the summary came from: 'llm' or 'heuristic'.
+    use_cache=False: ask the model again instead of replaying (or storing) a cached response.
+    """
+    print("IN Summarize chunk")
+    with span('summarize_chunk', chunk_id=chunk_id) as sp:
+        # the heuristic fallback still reads the whole chunk
+        prompt, max_resp, prompt_tokens = _chunk_request(chunk_text, budget)
+        sp.set(prompt_tokens=prompt_tokens)
+
+        try:
+            out = call_llm(prompt, max_tokens=max_resp, temperature=0.0, budget=budget, use_cache=use_cache)
+        except BudgetExceeded as e:
+            print("💸 Token budget spent, heuristic summary:", e)
+            out = None
+        parsed = _parse_chunk_response(out)
+        if parsed is not None:
+            sp.set(source='llm')
+            return parsed, 'llm'
+
+        sp.set(source='heuristic')
+        return heuristic_summarize(chunk_text, chunk_id), 'heuristic'
+
+
+def forget_chunk_summary(chunk_text: str):
+    """Drop the cached LLM response summarize_chunk would replay for this chunk (outside a budget)."""
+    prompt, max_resp, _ = _chunk_request(chunk_text, None)
+    forget_llm_response(prompt, max_tokens=max_resp, temperature=0.0)
+
+
+async def _asummarize_prepared(request: Tuple[str, int, int], chunk_id: str,
+                               budget: Optional[TokenBudget]) -> Optional[Dict]:
+    """Send one _chunk_request(); the parsed summary, or None if the caller should use the heuristic."""
+    prompt, max_resp, prompt_tokens = request
+    with span('summarize_chunk', chunk_id=chunk_id, prompt_tokens=prompt_tokens) as sp:
+        try:
+            out = await acall_llm(prompt, max_tokens=max_resp, temperature=0.0, budget=budget)
+        except BudgetExceeded as e:
+            print("💸 Token budget spent, heuristic summary:", e)
+            out = None
+        parsed = _parse_chunk_response(out)
+        sp.set(source='llm' if parsed is not None else 'heuristic')
+        return parsed
+
+
+# ---------- BATCHED CHUNK SUMMARIZATION ----------
+
+def build_batch_prompt(items: List[Tuple[str, str]]) -> str:
+    """items: list of (chunk_text, chunk_id). One request, one JSON object per chunk."""
+    parts = [
+        """
+            You are an expert research assistant.
+
+            Analyze EACH of the research paper chunks below independently and extract ONLY
+            factual information explicitly stated in that chunk.
+
+            DO NOT summarize generally.
+            DO NOT guess or infer.
+            DO NOT hallucinate.
+            Keep the summary technical and to the point.
+
+            ### RULES:
+            - The extracted summary should contain the methodology, results atleast.
+            - Extract the metric and their corresponding values with the method as well as a part of results.
+            - Include dataset names near reported metrics.
+            - Include metric names exactly.
+            - Evidence snippets MUST be copied verbatim from the same chunk.
+
+            ### OUTPUT:
+            Return ONLY a JSON array with exactly one object per chunk, in any order. Each object has keys:
+            chunk_id (copied exactly from the chunk header), problem (string), methods (list),
+            datasets (list), results (dict), limitations (list),
+            evidence (map of field -> list of {chunk_id, snippet}).
+            """
+    ]
+    for text, chunk_id in items:
+        parts.append(f"### CHUNK {chunk_id}\n{text}\n")
+    return "\n".join(parts)
+
+
+def _parse_batch_response(out: Optional[str]) -> Dict[str, Dict]:
+    """Map chunk_id -> summary dict from a batched response; malformed output yields {}."""
+    if not out:
+        return {}
+    try:
+        m = re.search(r'\[.*\]', out, flags=re.S)
+        parsed = json.loads(m.group(0)) if m else None
+    except Exception:
+        return {}
+    by_id = {}
+    for item in parsed if isinstance(parsed, list) else []:
+        if isinstance(item, dict) and item.get('chunk_id') is not None:
+            item = dict(item)
+            by_id[str(item.pop('chunk_id'))] = item
+    return by_id
+
+
+def _pack_batches(sizes: List[int], token_budget: int) -> List[List[int]]:
+    """Greedy in-order packing of chunk indices so each batch's text stays under token_budget."""
+    batches, current, used = [], [], 0
+    for i, n in enumerate(sizes):
+        if current and used + n > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def summarize_chunks_batched(items: List[Tuple[str, str]], token_budget: int = SUMMARY_BATCH_TOKENS,
+                             budget: Optional[TokenBudget] = None, with_source: bool = False) -> List:
+    """
+    items: list of (chunk_text, chunk_id). Returns one summary per item, in order, with the
+    same shape summarize_chunk returns. Chunks packed alone, and chunks missing from a batch
+    response (or whole failed batches), get individual summarize_chunk requests, issued
+    together on the shared LLM loop.
+    budget: TokenBudget scope the batch requests (and those per-chunk ones) are charged to.
+    with_source: return (summary, 'llm' | 'heuristic') pairs instead.
+    """
+    if not items:
+        return []
+    if token_budget > 0:
+        # every chunk in a batch is held to the cap summarize_chunk applies to it on its own;
+        # the untrimmed text is kept for the per-chunk requests
+        allowed = MAX_TOTAL_TOKENS - max(128, RESP_TOKENS_RESERVED) - _template_tokens()
+        sizes = count_tokens_batch([text for text, _ in items], memo=True)
+        sent = list(items)
+        for i, n in enumerate(sizes):
+            if n > allowed:
+                sent[i] = (_trim_tokens(items[i][0], allowed), items[i][1])
+                sizes[i] = count_tokens(sent[i][0], memo=True)
+        batches = _pack_batches(sizes, token_budget)
+    else:
+        sent, batches = items, [[i] for i in range(len(items))]
+    multi = [b for b in batches if len(b) > 1]
+    print(f"📦 Summarizing {len(items)} chunks in {len(batches)} requests")
+
+    async def _call(b):
+        try:
+            return await acall_llm(build_batch_prompt([sent[i] for i in b]),
+                                   max_tokens=min(SUMMARY_BATCH_MAX_RESP, RESP_TOKENS_RESERVED * len(b)),
+                                   temperature=0.0, budget=budget)
+        except BudgetExceeded:
+            return None
+
+    async def _run(batch_list, singles):
+        # prompts are built and results parsed in the calling thread; the loop only waits on requests
+        return await asyncio.gather(*[_call(b) for b in batch_list],
+                                    *[_asummarize_prepared(req, items[i][1], budget) for i, req in singles])
+
+    results: List[Optional[Tuple[Dict, str]]] = [None] * len(items)
+
+    def _collect(singles, parsed):
+        for (i, _), summ in zip(singles, parsed):
+            results[i] = (summ, 'llm') if summ is not None else (heuristic_summarize(*items[i]), 'heuristic')
+
+    singles = [(b[0], _chunk_request(items[b[0]][0], budget)) for b in batches if len(b) == 1]
+    responses = run_llm_coroutine(_run(multi, singles))
+
+    fallback = []
+    for b, out in zip(multi, responses):
+        by_id = _parse_batch_response(out)
+        for i in b:
+            summ = by_id.get(str(items[i][1]))
+            if summ is not None:
+                results[i] = (summ, 'llm')
+            else:
+                fallback.append(i)
+        missing = sum(results[i] is None for i in b)
+        if missing:
+            print(f"⚠️ Batch response missing {missing}/{len(b)} chunks, falling back to per-chunk calls")
+    _collect(singles, responses[len(multi):])
+
+    if fallback:
+        singles = [(i, _chunk_request(items[i][0], budget)) for i in fallback]
+        _collect(singles, run_llm_coroutine(_run([], singles)))
+    return results if with_source else [summ for summ, _ in results]
 
 
 # ---------- PAPER-LEVEL SUMMARIZATION (NEW) ----------
@@ -378,20 +569,31 @@ def _build_paper_prompt(chunk_summaries: List[Dict], meta: Dict) -> str:
     return prompt
 
 
-def summarize_paper_from_chunks(chunk_summaries: List[Dict], meta: Dict) -> Dict:
+def summarize_paper_from_chunks(chunk_summaries: List[Dict], meta: Dict,
+                                budget: Optional[TokenBudget] = None) -> Dict:
     """
     Aggregate chunk-level summaries into a single paper-level summary.
-    Uses LLM if available, otherwise falls back to a deterministic merge.
+    Uses LLM if available (and budget, if given, is not spent), otherwise falls back to a deterministic merge.
     """
+    return summarize_paper_with_source(chunk_summaries, meta, budget)[0]
+
+
+def summarize_paper_with_source(chunk_summaries: List[Dict], meta: Dict,
+                                budget: Optional[TokenBudget] = None) -> Tuple[Dict, str]:
+    """summarize_paper_from_chunks, plus 'llm' or 'heuristic' for which path produced it."""
     # Try LLM-based aggregation
     prompt = _build_paper_prompt(chunk_summaries, meta)
-    out = call_llm(prompt, max_tokens=512, temperature=0.0)
+    try:
+        out = call_llm(prompt, max_tokens=512, temperature=0.0, budget=budget)
+    except BudgetExceeded as e:
+        print("💸 Token budget spent, merging chunk summaries:", e)
+        out = None
 
     if out:
         try:
             m = re.search(r'\{.*\}', out, flags=re.S)
             if m:
-                return json.loads(m.group(0))
+                return json.loads(m.group(0)), 'llm'
         except Exception:
             pass
 
@@ -428,4 +630,4 @@ def summarize_paper_from_chunks(chunk_summaries: List[Dict], meta: Dict) -> Dict
         "overall_datasets": sorted(datasets_set),
         "overall_results": results_agg,
         "overall_limitations": sorted(limitations_set),
-    }
+    }, 'heuristic'
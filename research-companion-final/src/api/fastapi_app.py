@@ -1,19 +1,67 @@
-from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
+from fastapi import FastAPI, Request, Form, HTTPException
+from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pydantic import BaseModel
 from src.orchestrator.orchestrator import Orchestrator
+from src.llm.client import llm_cache_stats
+from src.utils.tracing import METRICS
+from src.api.jobs import JobQueue, QueueFull
 import os, json
+from typing import Dict, Optional
 
 app = FastAPI(title="Research Companion API")
 app.mount('/static', StaticFiles(directory=os.path.join(os.path.dirname(__file__),'..','ui','static')), name='static')
 templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__),'..','ui','templates'))
 orc = Orchestrator(tmp_dir=os.getenv('CACHE_DIR','./artifacts'))
+jobs = JobQueue(orc)
 
 class QueryRequest(BaseModel):
     query: str
     max_results: int = 3
+    include_trace: bool = False   # attach a per-stage/per-span timing breakdown to the result
+    source: str = 'arxiv'         # 'local': answer from the index of already-processed papers, no network
+    # relevance pre-filter: LLM-summarize only the chunks of each paper that best match the query
+    # (at most chunk_top_k, within chunk_token_budget tokens; 0 = no limit, None = server default)
+    chunk_top_k: Optional[int] = None
+    chunk_token_budget: Optional[int] = None
+    # cap on the prompt + output tokens of all LLM calls this query makes (0 = unlimited, None = server default)
+    llm_token_budget: Optional[int] = None
+
+
+def _run_options(req: QueryRequest) -> Dict:
+    return {k: v for k, v in (('chunk_top_k', req.chunk_top_k), ('chunk_token_budget', req.chunk_token_budget),
+                              ('llm_token_budget', req.llm_token_budget))
+            if v is not None}
+
+
+def _require_arxiv(req: QueryRequest):
+    """The streaming and job endpoints run the full pipeline; local answers come from /query only."""
+    if req.source != 'arxiv':
+        raise HTTPException(status_code=400, detail="source must be 'arxiv' here; use POST /query for 'local'")
+
+
+def _collect_cache_metrics():
+    stats = llm_cache_stats()
+    for key in ('hits', 'misses', 'bytes_saved', 'evictions', 'entries', 'bytes'):
+        if key in stats:
+            METRICS.set_gauge(f'rc_llm_cache_{key}', stats[key], help=f'LLM response cache {key}')
+    if orc.artifacts is not None:
+        for key, value in orc.artifacts.stats().items():
+            METRICS.set_gauge(f'rc_artifact_cache_{key}', value, help=f'Derived-artifact cache {key}')
+    if orc.local_index is not None:
+        for key, value in orc.local_index.stats().items():
+            METRICS.set_gauge(f'rc_local_index_{key}', value, help=f'Local retrieval index {key}')
+    METRICS.set_gauge('rc_query_cache_entries', len(orc.results), help='Cached /query results')
+    job_stats = jobs.stats()
+    METRICS.set_gauge('rc_job_queue_depth', job_stats['queued'], help='Jobs waiting for a worker')
+    METRICS.set_gauge('rc_jobs_running', job_stats['running'], help='Jobs currently running')
+    METRICS.set_gauge('rc_job_oldest_wait_seconds', job_stats['oldest_queued_seconds'],
+                      help='Age of the oldest queued job')
+
+
+METRICS.register_collector(_collect_cache_metrics)
 
 @app.get('/', response_class=HTMLResponse)
 def index(request: Request):
@@ -21,5 +69,73 @@ def index(request: Request):
 
 @app.post('/query', response_class=JSONResponse)
 async def run_query(req: QueryRequest):
-    result = orc.run(query=req.query, max_results=req.max_results)
+    if req.source == 'local':
+        return JSONResponse(await run_in_threadpool(orc.run_local, query=req.query, max_results=req.max_results))
+    if req.source != 'arxiv':
+        raise HTTPException(status_code=400, detail="source must be 'arxiv' or 'local'")
+    # orc.run blocks for the whole pipeline; keep it off the event loop
+    result = await run_in_threadpool(orc.run, query=req.query, max_results=req.max_results,
+                                     include_trace=req.include_trace, **_run_options(req))
     return JSONResponse(result)
+
+
+def _ndjson(events):
+    for ev in events:
+        yield json.dumps(ev, ensure_ascii=False, default=str) + '\n'
+
+
+def _sse(events):
+    for ev in events:
+        yield f"event: {ev.get('event', 'message')}\ndata: {json.dumps(ev, ensure_ascii=False, default=str)}\n\n"
+
+
+@app.post('/query/stream')
+async def run_query_stream(req: QueryRequest, format: str = 'ndjson'):
+    """
+    Stream pipeline events: progress after each stage, one 'paper' event per finished paper,
+    then a final 'result' event with the corpus-level sections.
+    ?format=ndjson (default) or ?format=sse for text/event-stream.
+    """
+    _require_arxiv(req)
+    events = orc.run_iter(query=req.query, max_results=req.max_results, include_trace=req.include_trace,
+                          **_run_options(req))
+    if format == 'sse':
+        return StreamingResponse(iterate_in_threadpool(_sse(events)), media_type='text/event-stream')
+    return StreamingResponse(iterate_in_threadpool(_ndjson(events)), media_type='application/x-ndjson')
+
+
+@app.post('/jobs', status_code=202)
+def create_job(req: QueryRequest):
+    """Queue a query; poll GET /jobs/{id} for progress and the result."""
+    _require_arxiv(req)
+    try:
+        job = jobs.submit(req.query, max_results=req.max_results, include_trace=req.include_trace,
+                          **_run_options(req))
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {'id': job['id'], 'status': job['status'], 'status_url': f"/jobs/{job['id']}"}
+
+
+@app.get('/jobs')
+def job_stats():
+    return jobs.stats()
+
+
+@app.get('/jobs/{job_id}')
+def get_job(job_id: str):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='unknown or expired job')
+    return job
+
+
+@app.get('/health')
+async def health():
+    # answered on the event loop itself, so busy worker threads cannot delay it
+    return {'status': 'ok', 'jobs': jobs.stats()}
+
+
+@app.get('/metrics', response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition: stage latency histograms, stage/LLM counters, cache gauges."""
+    return PlainTextResponse(METRICS.render_prometheus(), media_type='text/plain; version=0.0.4')
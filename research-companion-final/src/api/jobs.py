@@ -0,0 +1,124 @@
+"""
+Background jobs for long-running queries.
+
+POST /jobs enqueues an Orchestrator.run and returns an id straight away; a bounded
+thread pool works through the queue and GET /jobs/{id} reports status, progress and,
+once finished, the result. Finished jobs are forgotten after JOB_RESULT_TTL seconds.
+"""
+import os, time, uuid, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from src.utils.tracing import METRICS
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))             # queries running at once
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '100'))     # waiting jobs before submit is refused
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', '3600'))  # seconds a finished job stays retrievable
+
+FINISHED = ('done', 'failed')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    def __init__(self, orchestrator, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED,
+                 result_ttl: float = JOB_RESULT_TTL):
+        self.orc = orchestrator
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+
+    def submit(self, query: str, max_results: int = 3, include_trace: bool = False, **run_options) -> Dict:
+        """run_options are passed on to Orchestrator.run (e.g. chunk_top_k)."""
+        self._expire()
+        with self._lock:
+            if sum(j['status'] == 'queued' for j in self._jobs.values()) >= self.max_queued:
+                METRICS.inc('rc_jobs_rejected_total', help='Jobs refused because the queue was full')
+                raise QueueFull(f"{self.max_queued} jobs already queued")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'id': job_id, 'status': 'queued', 'query': query, 'max_results': max_results,
+                'include_trace': include_trace, 'run_options': run_options, 'created_at': time.time(),
+                'started_at': None, 'finished_at': None,
+                'progress': {'stage': None, 'papers_total': None, 'papers_done': 0},
+                'result': None, 'error': None,
+            }
+            view = self._view(self._jobs[job_id])
+        self._pool.submit(self._run, job_id)
+        return view
+
+    def _run(self, job_id: str):
+        with self._lock:
+            job = self._jobs[job_id]
+            job['status'] = 'running'
+            job['started_at'] = time.time()
+            query, max_results, include_trace = job['query'], job['max_results'], job['include_trace']
+            run_options = job['run_options']
+        METRICS.observe('rc_job_wait_seconds', job['started_at'] - job['created_at'],
+                        help='Time jobs spent queued before a worker picked them up')
+
+        def on_event(ev):
+            with self._lock:
+                progress = job['progress']
+                if ev['event'] == 'progress':
+                    progress['stage'] = ev['stage']
+                    if ev['stage'] == 'retrieval':
+                        progress['papers_total'] = ev['papers']
+                elif ev['event'] == 'paper':
+                    progress['papers_done'] += 1
+
+        try:
+            result = self.orc.run(query, max_results=max_results, include_trace=include_trace,
+                                  on_event=on_event, **run_options)
+            status, error = ('failed', result.get('error')) if 'error' in result else ('done', None)
+        except Exception as e:
+            print("❌ job failed:", job_id, e)
+            result, status, error = None, 'failed', str(e)
+
+        with self._lock:
+            job['result'] = result
+            job['error'] = error
+            job['status'] = status
+            job['finished_at'] = time.time()
+            run_seconds = job['finished_at'] - job['started_at']
+        METRICS.observe('rc_job_run_seconds', run_seconds, help='Time jobs spent running')
+        METRICS.inc('rc_jobs_total', help='Finished jobs', status=status)
+
+    @staticmethod
+    def _view(job: Dict) -> Dict:
+        view = {k: v for k, v in job.items() if k not in ('result', 'include_trace')}
+        view['progress'] = dict(job['progress'])
+        if job['status'] in FINISHED:
+            view['result'] = job['result']
+        return view
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        self._expire()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else None
+
+    def _expire(self):
+        cutoff = time.time() - self.result_ttl
+        with self._lock:
+            for job_id in [k for k, j in self._jobs.items()
+                           if j['status'] in FINISHED and j['finished_at'] < cutoff]:
+                del self._jobs[job_id]
+
+    def stats(self) -> Dict:
+        self._expire()
+        now = time.time()
+        with self._lock:
+            queued = [j for j in self._jobs.values() if j['status'] == 'queued']
+            return {
+                'workers': self.workers,
+                'queued': len(queued),
+                'running': sum(j['status'] == 'running' for j in self._jobs.values()),
+                'finished': sum(j['status'] in FINISHED for j in self._jobs.values()),
+                'oldest_queued_seconds': round(max((now - j['created_at'] for j in queued), default=0.0), 3),
+            }
@@ -1,36 +1,145 @@
-# from typing import List, Dict
-# from .tokenizer import count_tokens
-# def chunk_text_by_tokens(text: str, max_tokens: int = 800, overlap: int = 50):
-#     words = text.split()
-#     chunks = []
-#     i=0; n=len(words)
-#     while i < n:
-#         j = min(n, i + max_tokens)
-#         chunk = ' '.join(words[i:j])
-#         chunks.append({'text': chunk, 'start': i, 'end': j})
-#         i = j - overlap
-#     return chunks
-
-import spacy
-from .tokenizer import count_tokens
-from itertools import accumulate
-
-nlp = spacy.load("en_core_web_sm")
-
-def chunk_text_by_tokens(text, max_tokens=1000):
-    doc = nlp(text)
-    sents = [s.text for s in doc.sents]
-
-    token_sizes = list(map(count_tokens, sents))
-    cum = list(accumulate(token_sizes))
-
-    cuts = [0]
-    for i, total in enumerate(cum):
-        if total > max_tokens:
-            cuts.append(i)
-            cum = list(accumulate(token_sizes[i:]))
-    cuts.append(len(sents))
-
-    return [{"text": " ".join(sents[cuts[i]:cuts[i+1]])}
-            for i in range(len(cuts)-1)]
+"""
+Sentence-packing chunker: an alternative to section_chunker's word-window splitting
+that never cuts a sentence in half.
 
+The spaCy model is loaded on first use with only its sentence segmenter (falling back
+to a blank pipeline + rule-based sentencizer, and to a regex if spaCy is missing), text
+is streamed through nlp.pipe in bounded pieces, sentence token counts come from one
+batched tiktoken call, and sentences are packed in a single pass.
+"""
+
+import os, re, threading
+from typing import Dict, Iterable, List, Tuple
+
+from .tokenizer import count_tokens_batch
+
+SPACY_MODEL = os.getenv('SPACY_MODEL', 'en_core_web_sm')
+SPACY_PIECE_CHARS = int(os.getenv('SPACY_PIECE_CHARS', '20000'))   # text per nlp.pipe doc
+SPACY_BATCH_SIZE = int(os.getenv('SPACY_BATCH_SIZE', '32'))
+# everything in the trained English pipelines except the statistical sentence segmenter
+_UNUSED_PIPES = ['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'ner']
+
+_SENT_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9(\[])')
+
+_nlp = None
+_nlp_loaded = False
+_nlp_lock = threading.Lock()
+
+
+def _load_nlp():
+    try:
+        import spacy
+    except ImportError:
+        print("⚠️ spaCy not installed, splitting sentences with a regex")
+        return None
+    try:
+        nlp = spacy.load(SPACY_MODEL, exclude=_UNUSED_PIPES)
+        if 'senter' not in nlp.pipe_names:
+            nlp.enable_pipe('senter')
+        print(f"✂️ Splitting sentences with spaCy {SPACY_MODEL} (senter)")
+    except Exception as e:
+        print(f"⚠️ spaCy model {SPACY_MODEL} unavailable ({e}), using the rule-based sentencizer")
+        nlp = spacy.blank('en')
+        nlp.add_pipe('sentencizer')
+    nlp.max_length = max(nlp.max_length, SPACY_PIECE_CHARS * 2)
+    return nlp
+
+
+def get_nlp():
+    """Sentence-segmentation pipeline, loaded once on first use."""
+    global _nlp, _nlp_loaded
+    if not _nlp_loaded:
+        with _nlp_lock:
+            if not _nlp_loaded:
+                _nlp = _load_nlp()
+                _nlp_loaded = True
+    return _nlp
+
+
+def _pieces(text: str, limit: int = SPACY_PIECE_CHARS) -> Iterable[str]:
+    """Cut text into pieces of at most `limit` chars at a newline, sentence end or space."""
+    start, n = 0, len(text)
+    while n - start > limit:
+        end = start + limit
+        cut = text.rfind('\n', start, end)
+        if cut <= start:
+            cut = text.rfind('. ', start, end) + 1
+        if cut <= start:
+            cut = text.rfind(' ', start, end)
+        if cut <= start:
+            cut = end
+        yield text[start:cut]
+        start = cut
+    if start < n:
+        yield text[start:]
+
+
+def split_sentences(texts: List[str]) -> List[List[str]]:
+    """Sentences of every text, segmenting all of them in one batched nlp.pipe stream."""
+    sents: List[List[str]] = [[] for _ in texts]
+    nlp = get_nlp()
+    if nlp is None:
+        for i, text in enumerate(texts):
+            sents[i] = [s.strip() for s in _SENT_RE.split(text) if s.strip()]
+        return sents
+    stream = ((piece, i) for i, text in enumerate(texts) for piece in _pieces(text))
+    for doc, i in nlp.pipe(stream, as_tuples=True, batch_size=SPACY_BATCH_SIZE):
+        sents[i].extend(s.text.strip() for s in doc.sents if s.text.strip())
+    return sents
+
+
+def pack_sentences(sizes: List[int], max_tokens: int, overlap: int = 0) -> List[Tuple[int, int, int]]:
+    """
+    Group consecutive sentences into (start, end, tokens) spans of at most max_tokens.
+    Each new span repeats the previous span's trailing sentences, up to `overlap` tokens.
+    A single sentence larger than max_tokens becomes a span of its own.
+    """
+    spans = []
+    start, total = 0, 0
+    for i, n in enumerate(sizes):
+        if total + n > max_tokens and i > start:
+            spans.append((start, i, total))
+            new_start, carried = i, 0
+            # never carry the whole previous span, and leave room for sentence i
+            while (new_start - 1 > start and carried + sizes[new_start - 1] <= overlap
+                   and carried + sizes[new_start - 1] + n <= max_tokens):
+                new_start -= 1
+                carried += sizes[new_start]
+            start, total = new_start, carried
+        total += n
+    if start < len(sizes):
+        spans.append((start, len(sizes), total))
+    return spans
+
+
+def _chunk_sentences(sents: List[str], sizes: List[int], max_tokens: int, overlap: int) -> List[Dict]:
+    return [{'text': ' '.join(sents[s:e]), 'tokens': tokens, 'start': s, 'end': e}
+            for s, e, tokens in pack_sentences(sizes, max_tokens, overlap)]
+
+
+def chunk_text_by_tokens(text: str, max_tokens: int = 1000, overlap: int = 0) -> List[Dict]:
+    """
+    Chunks of whole sentences: [{'text', 'tokens', 'start', 'end'}] with start/end as
+    sentence indices. 'tokens' is the sum of the per-sentence counts.
+    """
+    sents = split_sentences([text])[0]
+    return _chunk_sentences(sents, count_tokens_batch(sents), max_tokens, overlap)
+
+
+def sentence_chunker(sections: List[Dict], max_tokens: int = 3000, overlap: int = 0) -> List[Dict]:
+    """
+    Drop-in alternative to section_chunker.chunk_sections for [{'title', 'text'}] sections:
+    same chunk shape, but oversize sections are packed sentence by sentence.
+    """
+    per_section = split_sentences([s['text'] for s in sections])
+    sizes = iter(count_tokens_batch([sent for sents in per_section for sent in sents]))
+    chunks = []
+    for sec, sents in zip(sections, per_section):
+        parts = _chunk_sentences(sents, [next(sizes) for _ in sents], max_tokens, overlap)
+        for n, part in enumerate(parts):
+            chunks.append({
+                "section": sec['title'] if len(parts) == 1 else f"{sec['title']} (part {n+1})",
+                "text": part['text'],
+                "tokens": part['tokens'],
+            })
+    return chunks
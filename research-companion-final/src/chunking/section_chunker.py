@@ -86,7 +86,11 @@
 
 #     return chunks
 import re
-from .tokenizer import count_tokens
+from .tokenizer import count_tokens, count_tokens_batch, encode_tokens, decode_tokens, token_text
+
+SPLIT_MODES = ('words', 'tokens')
+SNAP_FRACTION = 0.2   # token split: a part may give up at most this share of the budget to end on a sentence
+_SENT_END_RE = re.compile(r'[.!?]["\'\u201d)\]]*$')
 
 # ✅ Valuable sections
 KEEP_SECTIONS = [
@@ -131,11 +135,16 @@ KEEP_RE = re.compile("|".join(KEEP_SECTIONS), re.I)
 DROP_RE = re.compile("|".join(DROP_SECTIONS), re.I)
 
 
-def section_chunker(text: str, max_tokens: int = 3000):
+def section_chunker(text: str, max_tokens: int = 3000, split: str = 'words', overlap: int = 0):
     """
     Split paper into semantic chunks.
     Keeps only informative sections and drops noise.
     """
+    return chunk_sections(split_kept_sections(text), max_tokens, split, overlap)
+
+
+def split_kept_sections(text: str):
+    """Kept sections of the line-oriented paper text as [{'title', 'text'}]."""
 
     lines = text.splitlines()
 
@@ -168,10 +177,30 @@ def section_chunker(text: str, max_tokens: int = 3000):
     if current_body and current_title != "SKIP":
         sections.append((current_title, "\n".join(current_body)))
 
+    return [{'title': title, 'text': body} for title, body in sections]
+
+
+def chunk_sections(sections, max_tokens: int = 3000, split: str = 'words', overlap: int = 0):
+    """
+    Turn already-detected sections ([{'title', 'text'}], e.g. from the layout extractor)
+    into chunks, splitting the ones over max_tokens.
+
+    split='words'  : halves-of-the-budget word windows (the original behaviour)
+    split='tokens' : each section is encoded once and the token ids are cut at the
+                     budget, snapped back to a sentence end, with `overlap` tokens repeated
+    """
+    if split not in SPLIT_MODES:
+        raise ValueError(f"split must be one of {SPLIT_MODES}, got {split!r}")
+    sections = [(s['title'], s['text']) for s in sections]
+
     # ---------- split large sections ----------
     chunks = []
-    for title, body in sections:
-        tokens = count_tokens(body)
+    if split == 'tokens':
+        section_ids = encode_tokens([body for _, body in sections])
+        section_tokens = [len(ids) for ids in section_ids]
+    else:
+        section_tokens = count_tokens_batch([body for _, body in sections])
+    for n_sec, ((title, body), tokens) in enumerate(zip(sections, section_tokens)):
 
         if tokens <= max_tokens:
             chunks.append({
@@ -179,17 +208,56 @@ def section_chunker(text: str, max_tokens: int = 3000):
                 "text": body,
                 "tokens": tokens
             })
+        elif split == 'tokens':
+            # only oversize sections are decoded, one part at a time
+            ids = section_ids[n_sec]
+            for n, (start, end) in enumerate(_token_spans(ids, max_tokens, overlap)):
+                chunks.append({
+                    "section": f"{title} (part {n+1})",
+                    "text": decode_tokens(ids[start:end]),
+                    "tokens": end - start
+                })
         else:
             # split large sections only if needed
             words = body.split()
             step = max_tokens // 2
 
-            for i in range(0, len(words), step):
-                part = " ".join(words[i:i+step])
+            parts = [" ".join(words[i:i+step]) for i in range(0, len(words), step)]
+            for n, (part, part_tokens) in enumerate(zip(parts, count_tokens_batch(parts))):
                 chunks.append({
-                    "section": f"{title} (part {i//step+1})",
+                    "section": f"{title} (part {n+1})",
                     "text": part,
-                    "tokens": count_tokens(part)
+                    "tokens": part_tokens
                 })
 
     return chunks
+
+
+def _sentence_end(ids, i: int) -> bool:
+    """True if token i closes a sentence: ends in . ! ? (plus closing quotes/brackets) and whitespace follows."""
+    if not _SENT_END_RE.search(token_text(ids[i])):
+        return False
+    return i + 1 == len(ids) or token_text(ids[i + 1])[:1].isspace()
+
+
+def _token_spans(ids, max_tokens: int, overlap: int = 0):
+    """
+    (start, end) slices of ids of at most max_tokens each. A cut is moved back to the last
+    sentence end in the final SNAP_FRACTION of the window, if there is one; each slice after
+    the first starts `overlap` tokens before the previous cut.
+    """
+    overlap = max(0, min(overlap, max_tokens // 2))
+    spans = []
+    start, n = 0, len(ids)
+    while True:
+        end = min(n, start + max_tokens)
+        if end < n:
+            floor = end - int(max_tokens * SNAP_FRACTION)
+            for i in range(end - 1, max(floor, start) - 1, -1):
+                if _sentence_end(ids, i):
+                    end = i + 1
+                    break
+        spans.append((start, end))
+        if end >= n:
+            return spans
+        start = max(end - overlap, start + 1)
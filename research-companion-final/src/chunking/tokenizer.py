@@ -1,11 +1,117 @@
+import os, hashlib, threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List
+
+# memo of text-hash -> token count, for texts that get counted repeatedly (prompts, sections)
+TOKEN_MEMO_SIZE = int(os.getenv('TOKEN_MEMO_SIZE', '4096'))
+
+_memo: "OrderedDict[tuple, int]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def _memo_key(text: str, model):
+    return (model, hashlib.blake2b(text.encode('utf-8', 'surrogatepass'), digest_size=16).digest())
+
+
+def _memo_get(key):
+    with _memo_lock:
+        n = _memo.get(key)
+        if n is not None:
+            _memo.move_to_end(key)
+        return n
+
+
+def _memo_put(key, n: int):
+    with _memo_lock:
+        _memo[key] = n
+        _memo.move_to_end(key)
+        while len(_memo) > TOKEN_MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
 try:
     import tiktoken
-    def count_tokens(text: str, model: str = 'gpt-4o-mini'):
+
+    @lru_cache(maxsize=None)
+    def get_encoding(model: str = 'gpt-4o-mini'):
+        """Resolve the tiktoken encoder once per model and reuse it."""
         try:
-            enc = tiktoken.encoding_for_model(model)
+            return tiktoken.encoding_for_model(model)
         except Exception:
-            enc = tiktoken.get_encoding('cl100k_base')
-        return len(enc.encode(text))
+            return tiktoken.get_encoding('cl100k_base')
+
+    def _encode_len(texts: List[str], model: str) -> List[int]:
+        enc = get_encoding(model)
+        if len(texts) == 1:
+            return [len(enc.encode(texts[0]))]
+        return [len(ids) for ids in enc.encode_batch(texts)]
+
+    def encode_tokens(texts: List[str], model: str = 'gpt-4o-mini') -> List[List[int]]:
+        """Token ids of every text, in one batched call."""
+        texts = list(texts)
+        if not texts:
+            return []
+        enc = get_encoding(model)
+        if len(texts) == 1:
+            return [enc.encode(texts[0])]
+        return enc.encode_batch(texts)
+
+    def decode_tokens(ids, model: str = 'gpt-4o-mini') -> str:
+        return get_encoding(model).decode(list(ids))
+
+    def token_text(token, model: str = 'gpt-4o-mini') -> str:
+        """Text of a single token id (partial UTF-8 sequences come back as U+FFFD)."""
+        return get_encoding(model).decode_single_token_bytes(token).decode('utf-8', 'replace')
+
 except Exception:
-    def count_tokens(text: str, model: str = None):
-        return max(1, len(text.split()))
+    def get_encoding(model: str = None):
+        return None
+
+    def _encode_len(texts: List[str], model: str = None) -> List[int]:
+        return [max(1, len(t.split())) for t in texts]
+
+    # without tiktoken a "token" is a whitespace-separated word, matching the counts above
+    def encode_tokens(texts: List[str], model: str = None) -> List[List[str]]:
+        return [t.split() for t in texts]
+
+    def decode_tokens(ids, model: str = None) -> str:
+        return ' '.join(ids)
+
+    def token_text(token, model: str = None) -> str:
+        return ' ' + token
+
+
+def count_tokens(text: str, model: str = 'gpt-4o-mini', memo: bool = False) -> int:
+    if not memo:
+        return _encode_len([text], model)[0]
+    key = _memo_key(text, model)
+    n = _memo_get(key)
+    if n is None:
+        n = _encode_len([text], model)[0]
+        _memo_put(key, n)
+    return n
+
+
+def count_tokens_batch(texts: List[str], model: str = 'gpt-4o-mini', memo: bool = False) -> List[int]:
+    """Token counts for many texts in one batched (multi-threaded) tiktoken call."""
+    texts = list(texts)
+    if not texts:
+        return []
+    if not memo:
+        return _encode_len(texts, model)
+
+    counts = [None] * len(texts)
+    keys = [_memo_key(t, model) for t in texts]
+    todo = []
+    for i, key in enumerate(keys):
+        n = _memo_get(key)
+        if n is None:
+            todo.append(i)
+        else:
+            counts[i] = n
+    if todo:
+        for i, n in zip(todo, _encode_len([texts[i] for i in todo], model)):
+            counts[i] = n
+            _memo_put(keys[i], n)
+    return counts
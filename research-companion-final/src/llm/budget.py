@@ -0,0 +1,146 @@
+"""
+Per-query LLM token budget.
+
+A query gets one TokenBudget; the orchestrator carves it into scopes by priority
+(papers first, each paper's chunks before its paper summary, corpus stages last) and
+hands a scope to every LLM call. call_llm() reserves prompt + output tokens against the
+scope before sending, caps max_tokens to what is left, and records the actual usage
+afterwards. A call that cannot get BUDGET_MIN_OUTPUT output tokens raises
+BudgetExceeded, and the caller falls back to its heuristic path.
+"""
+import os, threading
+from typing import Dict, List, Optional
+
+from src.utils.tracing import METRICS
+
+QUERY_TOKEN_BUDGET = int(os.getenv('QUERY_TOKEN_BUDGET', '0'))                  # 0: unlimited
+BUDGET_CORPUS_SHARE = float(os.getenv('BUDGET_CORPUS_SHARE', '0.2'))            # held back for gaps + ranking
+BUDGET_PAPER_SUMMARY_SHARE = float(os.getenv('BUDGET_PAPER_SUMMARY_SHARE', '0.15'))  # of each paper's share
+BUDGET_MIN_OUTPUT = int(os.getenv('BUDGET_MIN_OUTPUT', '64'))                   # smaller allowance: call refused
+
+
+class BudgetExceeded(RuntimeError):
+    pass
+
+
+class TokenBudget:
+    """
+    Token allowance for a query or one part of it. Scopes form a tree sharing one lock;
+    a call is charged to its scope and every enclosing one, so no scope spends past its
+    own limit or a parent's.
+    """
+
+    def __init__(self, limit: int, name: str = 'query', parent: Optional['TokenBudget'] = None):
+        self.name = name
+        self.limit = max(0, int(limit))
+        self.parent = parent
+        self.children: List['TokenBudget'] = []
+        self._lock = parent._lock if parent is not None else threading.Lock()
+        self.used = self.reserved = 0
+        self.prompt_tokens = self.output_tokens = 0
+        self.calls = self.cached_calls = self.capped_calls = self.denied_calls = self.trimmed_calls = 0
+
+    def _chain(self):
+        scope = self
+        while scope is not None:
+            yield scope
+            scope = scope.parent
+
+    def _available(self) -> int:
+        # called with the lock held
+        return max(0, min(s.limit - s.used - s.reserved for s in self._chain()))
+
+    def remaining(self) -> int:
+        with self._lock:
+            return self._available()
+
+    @property
+    def limited(self) -> bool:
+        """True once any call in this scope was refused, had its output capped or its input trimmed."""
+        with self._lock:
+            return bool(self.denied_calls or self.capped_calls or self.trimmed_calls)
+
+    def child(self, name: str, share: float = 1.0) -> 'TokenBudget':
+        """New scope holding share of what is left here now; unspent tokens flow back to later scopes."""
+        with self._lock:
+            scope = TokenBudget(int(self._available() * share), name, parent=self)
+            self.children.append(scope)
+        return scope
+
+    def split(self, names: List[str]) -> List['TokenBudget']:
+        """Equal scopes, one per name, dividing what is left here now."""
+        with self._lock:
+            each = self._available() // max(1, len(names))
+            scopes = [TokenBudget(each, name, parent=self) for name in names]
+            self.children.extend(scopes)
+        return scopes
+
+    def reserve(self, prompt_tokens: int, max_tokens: int) -> int:
+        """
+        Hold prompt_tokens plus up to max_tokens of output until record(); returns the output
+        tokens the call may request. Raises BudgetExceeded if fewer than BUDGET_MIN_OUTPUT are left.
+        """
+        with self._lock:
+            available = self._available()
+            allowed = min(max_tokens, available - prompt_tokens)
+            capped = allowed < max_tokens
+            if allowed < min(max_tokens, BUDGET_MIN_OUTPUT):
+                for s in self._chain():
+                    s.denied_calls += 1
+                denied = True
+            else:
+                for s in self._chain():
+                    s.reserved += prompt_tokens + allowed
+                    s.capped_calls += capped
+                denied = False
+        if denied:
+            METRICS.inc('rc_llm_budget_calls_total', help='Budgeted LLM calls by outcome', outcome='denied')
+            raise BudgetExceeded(f"{self.name}: {prompt_tokens} prompt tokens, {available} tokens left")
+        METRICS.inc('rc_llm_budget_calls_total', help='Budgeted LLM calls by outcome',
+                    outcome='capped' if capped else 'granted')
+        return allowed
+
+    def note_trimmed(self):
+        """A caller cut its prompt input down to fit what is left here."""
+        with self._lock:
+            for s in self._chain():
+                s.trimmed_calls += 1
+
+    def record(self, reserved: int, prompt_tokens: int, output_tokens: int, cached: bool = False):
+        """Release a reservation (reserve()'s prompt_tokens + its return value) and charge actual usage."""
+        spent = 0 if cached else prompt_tokens + output_tokens
+        with self._lock:
+            for s in self._chain():
+                s.reserved -= reserved
+                s.used += spent
+                if cached:
+                    s.cached_calls += 1
+                else:
+                    s.calls += 1
+                    s.prompt_tokens += prompt_tokens
+                    s.output_tokens += output_tokens
+        if spent:
+            METRICS.inc('rc_llm_budget_tokens_total', spent, help='Tokens charged to query budgets')
+
+    def report(self, depth: int = 1) -> Dict:
+        """Usage of this scope and, depth levels down, of its sub-scopes."""
+        with self._lock:
+            return self._report(depth)
+
+    def _report(self, depth: int) -> Dict:
+        rep = {
+            'name': self.name,
+            'limit': self.limit,
+            'used': self.used,
+            'remaining': max(0, self.limit - self.used - self.reserved),
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens,
+            'calls': self.calls,
+            'cached_calls': self.cached_calls,
+            'capped_calls': self.capped_calls,
+            'denied_calls': self.denied_calls,
+            'trimmed_calls': self.trimmed_calls,
+        }
+        if depth > 0 and self.children:
+            rep['scopes'] = [c._report(depth - 1) for c in self.children]
+        return rep
@@ -0,0 +1,154 @@
+import os, json, hashlib, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(os.getenv('CACHE_DIR', './artifacts'), 'llm_cache'))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+
+def cache_key(prompt: str, model: str, max_tokens: int, temperature: float) -> str:
+    """Content address of one LLM request: identical inputs map to the same entry."""
+    h = hashlib.sha256()
+    for part in (model, str(max_tokens), repr(float(temperature)), prompt):
+        h.update(part.encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+class LLMCache:
+    """
+    Disk-backed response cache, one JSON file per entry.
+    Entries are evicted least-recently-used first once the directory exceeds max_bytes
+    (recency is tracked with file mtimes so it survives restarts).
+    """
+
+    def __init__(self, root: str = LLM_CACHE_DIR, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None   # key -> size, oldest first
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self):
+        # called with the lock held; scans the directory once per process
+        if self._index is not None:
+            return
+        entries = []
+        if self.root.exists():
+            for f in self.root.glob('*/*.json'):
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, f.stem, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((k, size) for _, k, size in entries)
+        self._total = sum(self._index.values())
+
+    def get(self, key: str) -> Optional[str]:
+        # the file read and decode run outside the lock so hits from many threads proceed in
+        # parallel; entries are replaced atomically, so a read sees a whole file or none
+        path = self._path(key)
+        try:
+            data = json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            with self._lock:
+                self._load_index()
+                # a put() may have landed since the read; only drop entries that are really gone
+                if key in self._index and not path.exists():
+                    self._total -= self._index.pop(key)
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        response = data.get('response')
+        saved = len(response.encode('utf-8')) if response else 0
+        with self._lock:
+            self._load_index()
+            if key in self._index:
+                self._index.move_to_end(key)
+            self.hits += 1
+            self.bytes_saved += saved
+        return response
+
+    def put(self, key: str, response: str, model: str = ''):
+        payload = json.dumps({'model': model, 'created': time.time(), 'response': response},
+                             ensure_ascii=False).encode('utf-8')
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+                tmp.write_bytes(payload)
+                os.replace(tmp, path)
+            except OSError as e:
+                print("⚠️ LLM cache write failed:", e)
+                return
+            if key in self._index:
+                self._total -= self._index.pop(key)
+            self._index[key] = len(payload)
+            self._total += len(payload)
+            self._evict()
+
+    def discard(self, key: str):
+        """Drop one entry, e.g. a response the caller found unusable, so the next lookup misses."""
+        with self._lock:
+            self._load_index()
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+            if key in self._index:
+                self._total -= self._index.pop(key)
+
+    def _evict(self):
+        while self._total > self.max_bytes and len(self._index) > 1:
+            old_key, size = self._index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                self._path(old_key).unlink()
+            except OSError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'bytes_saved': self.bytes_saved,
+                'evictions': self.evictions,
+                'entries': len(self._index or {}),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+            }
+
+
+_cache: Optional[LLMCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Process-wide cache instance, or None when LLM_CACHE_ENABLED=0."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache()
+    return _cache
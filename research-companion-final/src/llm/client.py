@@ -36,7 +36,62 @@ GEMINI_KEY = os.getenv('GEMINI_API_KEY')
 
 from google import genai
 import os
-from typing import Optional
+import asyncio
+import threading
+from typing import Optional, List
+from src.llm.cache import get_llm_cache, cache_key
+from src.llm.budget import TokenBudget
+from src.chunking.tokenizer import count_tokens
+from src.utils.tracing import span, trace_active, METRICS, TRACING_ENABLED
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-lite")
+# process-wide cap on concurrent LLM requests (sync and async callers share it)
+LLM_MAX_INFLIGHT = int(os.getenv("LLM_MAX_INFLIGHT", "8"))
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+_inflight = threading.BoundedSemaphore(LLM_MAX_INFLIGHT)
+# the SDK's aio client holds one httpx.AsyncClient bound to the loop that first used it, so
+# all async LLM traffic runs on this one long-lived loop rather than a fresh asyncio.run()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_client(key: str):
+    """Return the shared genai.Client, creating it once per API key."""
+    global _client, _client_key
+    if _client is not None and _client_key == key:
+        return _client
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = genai.Client(api_key=key)
+            _client_key = key
+    return _client
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """Return the shared event loop for async LLM calls, started on a daemon thread on first use."""
+    global _loop
+    if _loop is None:
+        with _client_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='llm-loop', daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def run_llm_coroutine(coro):
+    """Run coro on the shared LLM loop and block until it finishes (for sync callers)."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result()
+
+
+async def _acquire_inflight():
+    # poll the shared threading semaphore so the event loop is never blocked
+    delay = 0.005
+    while not _inflight.acquire(blocking=False):
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 0.1)
 
 
 def call_gemini(prompt: str, max_tokens: int = 512, temperature: float = 0.0) -> Optional[str]:
@@ -49,15 +104,53 @@ def call_gemini(prompt: str, max_tokens: int = 512, temperature: float = 0.0) ->
         return None
 
     try:
-        client = genai.Client(api_key=key)
+        client = _get_client(key)
 
-        response = client.models.generate_content(
-            model="gemini-2.0-flash-lite",   # ✅ correct model
-            contents=prompt,
-            config={
-                "max_output_tokens": max_tokens,
-            },
-        )
+        with _inflight:
+            response = client.models.generate_content(
+                model=GEMINI_MODEL,   # ✅ correct model
+                contents=prompt,
+                config={
+                    "max_output_tokens": max_tokens,
+                    "temperature": temperature,
+                },
+            )
+
+        return response.text
+
+    except Exception as e:
+        print("❌ GEMINI ERROR:", e)
+        return None
+
+
+async def acall_gemini(prompt: str, max_tokens: int = 512, temperature: float = 0.0) -> Optional[str]:
+    """Async twin of call_gemini using the SDK's native aio client (no worker threads)."""
+    key = os.getenv("GEMINI_API_KEY")
+    if not key:
+        print("❌ Gemini key not found in environment")
+        return None
+
+    loop = _get_loop()
+    if asyncio.get_running_loop() is not loop:
+        # awaited from another loop (e.g. the API server's): hop over so the aio client stays on one loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+            acall_gemini(prompt, max_tokens=max_tokens, temperature=temperature), loop))
+
+    try:
+        client = _get_client(key)
+
+        await _acquire_inflight()
+        try:
+            response = await client.aio.models.generate_content(
+                model=GEMINI_MODEL,
+                contents=prompt,
+                config={
+                    "max_output_tokens": max_tokens,
+                    "temperature": temperature,
+                },
+            )
+        finally:
+            _inflight.release()
 
         return response.text
 
@@ -81,13 +174,123 @@ def call_gemini(prompt: str, max_tokens: int = 512, temperature: float = 0.0) ->
 #     except Exception as e:
 #         return None
 
-def call_llm(prompt: str, max_tokens: int = 1024, temperature: float = 0.0) -> Optional[str]:
+def _trace_llm(sp, prompt: str, out: Optional[str], cache_state: str, prompt_tokens: int = 0):
+    if not TRACING_ENABLED:
+        return
+    sp.set(model=GEMINI_MODEL, cache=cache_state)
+    METRICS.inc('rc_llm_calls_total', help='LLM requests by cache outcome', cache=cache_state)
+    # token counts only reach a requested trace; memoized, and reusing the budget's prompt count
+    if trace_active():
+        sp.set(prompt_tokens=prompt_tokens or count_tokens(prompt, memo=True),
+               completion_tokens=count_tokens(out, memo=True) if out else 0)
+
+
+def _reserve(budget: Optional[TokenBudget], prompt: str, max_tokens: int):
+    """(max_tokens to request, prompt tokens); raises BudgetExceeded when the budget is spent."""
+    if budget is None:
+        return max_tokens, 0
+    prompt_tokens = count_tokens(prompt, memo=True)
+    return budget.reserve(prompt_tokens, max_tokens), prompt_tokens
+
+
+def _settle(budget: Optional[TokenBudget], max_tokens: int, prompt_tokens: int, out: Optional[str]):
+    if budget is not None:
+        budget.record(prompt_tokens + max_tokens, prompt_tokens, count_tokens(out, memo=True) if out else 0)
+
+
+def call_llm(prompt: str, max_tokens: int = 1024, temperature: float = 0.0,
+             use_cache: bool = True, budget: Optional[TokenBudget] = None) -> Optional[str]:
+    """
+    budget: the caller's TokenBudget scope; max_tokens is capped to what it has left and
+    usage is charged to it. Raises BudgetExceeded instead of calling when it is spent.
+    """
     # prefer Gemini if configured
     # print("CALL LLM")
     out = None
     if GEMINI_KEY:
-        out = call_gemini(prompt, max_tokens=max_tokens, temperature=temperature)
+        with span('llm_call', max_tokens=max_tokens) as sp:
+            cache = get_llm_cache() if use_cache else None
+            # cached responses cost nothing: look up under the requested max_tokens before budgeting
+            if cache:
+                out = cache.get(cache_key(prompt, GEMINI_MODEL, max_tokens, temperature))
+                if out is not None:
+                    _trace_llm(sp, prompt, out, 'hit')
+                    if budget is not None:
+                        budget.record(0, 0, 0, cached=True)
+                    return out
+            max_tokens, prompt_tokens = _reserve(budget, prompt, max_tokens)
+            if budget is not None:
+                sp.set(max_tokens=max_tokens)
+            key = cache_key(prompt, GEMINI_MODEL, max_tokens, temperature) if cache else None
+            try:
+                out = call_gemini(prompt, max_tokens=max_tokens, temperature=temperature)
+            finally:
+                _settle(budget, max_tokens, prompt_tokens, out)
+            if cache and out is not None:
+                cache.put(key, out, model=GEMINI_MODEL)
+            _trace_llm(sp, prompt, out, 'miss' if cache else 'bypass', prompt_tokens)
     # if out is None and OPENAI_KEY:
     #     out = call_openai(prompt, max_tokens=max_tokens, temperature=temperature)
     # print("OUT : ",out)
     return out
+
+
+async def acall_llm(prompt: str, max_tokens: int = 1024, temperature: float = 0.0,
+                    use_cache: bool = True, budget: Optional[TokenBudget] = None) -> Optional[str]:
+    """Async variant of call_llm; same provider selection, caching, budgeting and return value."""
+    out = None
+    if GEMINI_KEY:
+        with span('llm_call', max_tokens=max_tokens) as sp:
+            cache = get_llm_cache() if use_cache else None
+            # cached responses cost nothing: look up under the requested max_tokens before budgeting
+            if cache:
+                out = cache.get(cache_key(prompt, GEMINI_MODEL, max_tokens, temperature))
+                if out is not None:
+                    _trace_llm(sp, prompt, out, 'hit')
+                    if budget is not None:
+                        budget.record(0, 0, 0, cached=True)
+                    return out
+            max_tokens, prompt_tokens = _reserve(budget, prompt, max_tokens)
+            if budget is not None:
+                sp.set(max_tokens=max_tokens)
+            key = cache_key(prompt, GEMINI_MODEL, max_tokens, temperature) if cache else None
+            try:
+                out = await acall_gemini(prompt, max_tokens=max_tokens, temperature=temperature)
+            finally:
+                _settle(budget, max_tokens, prompt_tokens, out)
+            if cache and out is not None:
+                cache.put(key, out, model=GEMINI_MODEL)
+            _trace_llm(sp, prompt, out, 'miss' if cache else 'bypass', prompt_tokens)
+    return out
+
+
+async def acall_llm_batch(prompts: List[str], max_tokens: int = 1024, temperature: float = 0.0,
+                          use_cache: bool = True) -> List[Optional[str]]:
+    """Issue all prompts concurrently (bounded by LLM_MAX_INFLIGHT); results keep prompt order."""
+    return await asyncio.gather(*[
+        acall_llm(p, max_tokens=max_tokens, temperature=temperature, use_cache=use_cache) for p in prompts
+    ])
+
+
+def call_llm_batch(prompts: List[str], max_tokens: int = 1024, temperature: float = 0.0,
+                   use_cache: bool = True) -> List[Optional[str]]:
+    """
+    Blocking batch entry point for sync code; runs on the shared LLM loop.
+    From inside a running event loop, await acall_llm_batch instead.
+    """
+    if not prompts:
+        return []
+    return run_llm_coroutine(acall_llm_batch(prompts, max_tokens=max_tokens, temperature=temperature,
+                                       use_cache=use_cache))
+
+
+def forget_llm_response(prompt: str, max_tokens: int = 1024, temperature: float = 0.0):
+    """Drop the cached response call_llm would return for these arguments."""
+    cache = get_llm_cache()
+    if cache:
+        cache.discard(cache_key(prompt, GEMINI_MODEL, max_tokens, temperature))
+
+
+def llm_cache_stats() -> dict:
+    cache = get_llm_cache()
+    return cache.stats() if cache else {'enabled': False}
@@ -1,162 +1,438 @@
-import os, json, time
-from typing import Dict
+import os, time, queue, copy, threading
+from typing import Dict, List, Optional, Iterator, Callable
 from pathlib import Path
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from src.retrieval.client_arxiv import query_arxiv
-from src.retrieval.downloader import download_pdf
-from src.parsing.pdf_extractor import extract_text_from_pdf
-from src.parsing.cleaner import clean_text
+from src.retrieval.downloader import download_pdf, prefetch_pdfs
+from src.retrieval.local_index import LocalIndex
+from src.retrieval.chunk_filter import select_chunks, RELEVANCE_TOP_K, RELEVANCE_TOKEN_BUDGET
+from src.parsing.cleaner import clean_text, extract_clean_text
 from src.parsing.sectioner import naive_section_split
+from src.parsing.layout_extractor import extract_layout_sections
 # from src.chunking.chunker import chunk_text_by_tokens
-from src.chunking.section_chunker import section_chunker
-from src.agents.summarizer import summarize_chunk, summarize_paper_from_chunks
-from src.agents.evaluator import verify_summary_factuality
-from src.agents.evaluator import evaluate_summary_llm
+from src.chunking.chunker import sentence_chunker
+from src.chunking.section_chunker import split_kept_sections, chunk_sections, SPLIT_MODES
+from src.agents.summarizer import summarize_chunk_with_source, summarize_paper_with_source, heuristic_summarize
+from src.agents.summarizer import forget_chunk_summary
+from src.agents.summarizer import build_prompt, _build_paper_prompt, MAX_TOTAL_TOKENS, RESP_TOKENS_RESERVED
+from src.agents.summarizer import summarize_chunks_batched, build_batch_prompt, SUMMARY_BATCH_TOKENS
+from src.agents.evaluator import verify_summary_factuality, VerificationIndex
+from src.agents.evaluator import evaluate_summary_llm, build_evaluator_prompt
 from src.agents.aggregator import aggregate_summaries
 from src.analysis.comparator import build_method_comparison
 from src.agents.research_gap import detect_research_gaps
 from src.agents.ranker import rank_papers
 from src.agents.ranker import rank_papers_llm
 from src.utils.references import build_references
+from src.storage.metadata_store import MetadataStore
+from src.storage.artifact_cache import ArtifactCache, fingerprint, file_sha256
+from src.llm.client import GEMINI_KEY, GEMINI_MODEL
+from src.llm.budget import TokenBudget, QUERY_TOKEN_BUDGET, BUDGET_CORPUS_SHARE, BUDGET_PAPER_SUMMARY_SHARE
+from src.utils.tracing import span, record, new_trace, run_in_trace, bind, METRICS
+from src.utils.ttl_cache import TTLCache
+
+# bounded concurrency: papers run in parallel, and each paper fans its chunks out
+MAX_WORKERS = int(os.getenv('ORCHESTRATOR_MAX_WORKERS', '4'))
+CHUNK_WORKERS = int(os.getenv('ORCHESTRATOR_CHUNK_WORKERS', '4'))
+
+MAX_RETRIES = 1   # run summarization again if evaluation fails
+# llm: every summary goes to the LLM evaluator
+# tiered: rule-based check first; only summaries it flags, or that have no textual evidence found verbatim
+#         in their own chunk, reach the LLM
+VERIFICATION_MODE = os.getenv('VERIFICATION_MODE', 'llm')
+VERIFICATION_MODES = ('llm', 'tiered')
+# text: whole-document text, line-regex sectioning
+# layout: PyMuPDF font/block headings; dropped sections are never read and extraction stops at References
+SECTION_EXTRACTOR = os.getenv('SECTION_EXTRACTOR', 'text')
+SECTION_EXTRACTORS = ('text', 'layout')
+CHUNK_MAX_TOKENS = 3000
+# section: oversize sections split into word windows
+# sentence: oversize sections packed from whole sentences (spaCy senter), with optional token overlap
+CHUNKER = os.getenv('CHUNKER', 'section')
+CHUNKERS = ('section', 'sentence')
+CHUNK_OVERLAP_TOKENS = int(os.getenv('CHUNK_OVERLAP_TOKENS', '0'))
+# section chunker only -- words: max_tokens // 2 word windows; tokens: token-id slices at the budget,
+# snapped to sentence ends, with CHUNK_OVERLAP_TOKENS overlap
+CHUNK_SPLIT = os.getenv('CHUNK_SPLIT', 'words')
+
+# per-paper derived-artifact cache (text, sections, chunks, summaries); bump a stage's
+# version when its code changes so it and every later stage are recomputed
+DERIVED_CACHE_ENABLED = os.getenv('DERIVED_CACHE_ENABLED', '1') not in ('0', 'false', 'False')
+STAGE_VERSIONS = {'text': 2, 'sections': 1, 'chunks': 1, 'summaries': 4, 'paper_summary': 1}
+
+# identical queries (same normalized text and max_results) share one in-flight run, and
+# successful results are reused for QUERY_CACHE_TTL seconds (0 disables the result cache)
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '600'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '64'))
+
+# every processed paper is added to the on-disk TF-IDF index that run_local() answers from
+LOCAL_INDEX_ENABLED = os.getenv('LOCAL_INDEX_ENABLED', '1') not in ('0', 'false', 'False')
+
+PAPER_STAGES = ['download', 'extract', 'clean_section', 'chunk', 'summarize', 'paper_summary']
 
 
 class Orchestrator:
-    def __init__(self, tmp_dir: str = './artifacts'):
+    def __init__(self, tmp_dir: str = './artifacts', max_workers: int = MAX_WORKERS,
+                 chunk_workers: int = CHUNK_WORKERS, summary_batch_tokens: int = SUMMARY_BATCH_TOKENS,
+                 verification_mode: str = VERIFICATION_MODE, section_extractor: str = SECTION_EXTRACTOR,
+                 chunker: str = CHUNKER, chunk_split: str = CHUNK_SPLIT):
+        if verification_mode not in VERIFICATION_MODES:
+            raise ValueError(f"verification_mode must be one of {VERIFICATION_MODES}, got {verification_mode!r}")
+        if section_extractor not in SECTION_EXTRACTORS:
+            raise ValueError(f"section_extractor must be one of {SECTION_EXTRACTORS}, got {section_extractor!r}")
+        if chunker not in CHUNKERS:
+            raise ValueError(f"chunker must be one of {CHUNKERS}, got {chunker!r}")
+        if chunk_split not in SPLIT_MODES:
+            raise ValueError(f"chunk_split must be one of {SPLIT_MODES}, got {chunk_split!r}")
         os.makedirs(tmp_dir, exist_ok=True)
         self.tmp_dir = tmp_dir
-        self.cache_meta = Path(tmp_dir) / "metadata.json"
-        if not self.cache_meta.exists():
-            self._write_meta({'papers': {}})
+        self.max_workers = max(1, max_workers)
+        self.chunk_workers = max(1, chunk_workers)
+        self.summary_batch_tokens = summary_batch_tokens
+        self.verification_mode = verification_mode
+        self.section_extractor = section_extractor
+        self.chunker = chunker
+        self.chunk_split = chunk_split
+        self.meta_store = MetadataStore(Path(tmp_dir) / "metadata.db")
+        # metadata.json was the store before SQLite; pull it in once
+        legacy_meta = Path(tmp_dir) / "metadata.json"
+        if legacy_meta.exists():
+            self.meta_store.import_json(legacy_meta)
+        self.artifacts = ArtifactCache(Path(tmp_dir) / "derived") if DERIVED_CACHE_ENABLED else None
+        self.local_index = LocalIndex(Path(tmp_dir) / "index") if LOCAL_INDEX_ENABLED else None
+        self.results = TTLCache(QUERY_CACHE_TTL, QUERY_CACHE_SIZE)
+        self._inflight: Dict[tuple, Future] = {}
+        self._inflight_lock = threading.Lock()
 
-    def _read_meta(self):
-        return json.loads(self.cache_meta.read_text())
+    def _stage_fingerprints(self, meta: Dict, relevance: Optional[tuple] = None) -> Dict[str, str]:
+        """
+        Chained fingerprints: each stage's key covers its own inputs plus all earlier stages.
+        relevance: (query, top_k, token_budget) when the chunk pre-filter is on; it then keys the summaries.
+        """
+        llm = (bool(GEMINI_KEY), GEMINI_MODEL)
+        fps = {}
+        fps['text'] = fingerprint('text', STAGE_VERSIONS['text'], self.section_extractor)
+        fps['sections'] = fingerprint(fps['text'], 'sections', STAGE_VERSIONS['sections'])
+        # overlap only applies to the token split and the sentence chunker; elsewhere it must not invalidate
+        uses_overlap = self.chunker == 'sentence' or self.chunk_split == 'tokens'
+        fps['chunks'] = fingerprint(fps['sections'], 'chunks', STAGE_VERSIONS['chunks'], CHUNK_MAX_TOKENS,
+                                    self.chunker, self.chunk_split,
+                                    *([CHUNK_OVERLAP_TOKENS] if uses_overlap else []))
+        fps['summaries'] = fingerprint(
+            fps['chunks'], 'summaries', STAGE_VERSIONS['summaries'], llm, MAX_RETRIES,
+            build_prompt('{text}'), build_evaluator_prompt('{summary}', '{chunk_text}'),
+            MAX_TOTAL_TOKENS, RESP_TOKENS_RESERVED,
+            self.summary_batch_tokens, build_batch_prompt([]) if self.summary_batch_tokens > 0 else None,
+            self.verification_mode, *([relevance] if relevance else []),
+        )
+        fps['paper_summary'] = fingerprint(
+            fps['summaries'], 'paper_summary', STAGE_VERSIONS['paper_summary'], llm,
+            _build_paper_prompt([], {}), meta,
+        )
+        return fps
 
-    def _write_meta(self, obj):
-        self.cache_meta.write_text(json.dumps(obj, indent=2))
+    def _summarize_and_verify(self, c: Dict, idx: int, n_chunks: int, pid: str, first: Optional[Dict] = None,
+                              index: Optional[VerificationIndex] = None, budget: Optional[TokenBudget] = None):
+        """
+        first: (summary, source) already produced by a batched request; retries still go per-chunk.
+        index: the paper's VerificationIndex, shared by all chunks and retries.
+        budget: the chunk's TokenBudget scope, shared by its summarize, evaluate and retry calls.
+        """
+        print(f"🧠 Summarizing chunk {idx+1}/{n_chunks}")
+        with span('chunk', paper_id=pid, chunk_index=idx, tokens=c.get('tokens')) as sp:
+            summ, v, retries, vstats = self._summarize_with_retries(c, idx, pid, first, index, budget)
+            sp.set(retries=retries, ok=v.get("ok", False) is True, **vstats)
+        return summ, v, vstats
 
-    def run(self, query: str, max_results: int = 3) -> Dict:
-        start_time = time.time()
-        print("\n============================")
-        print("🚀 ORCHESTRATOR STARTED")
-        print("📌 Query:", query)
-        print("📄 Max papers:", max_results)
-        print("============================\n")
+    def _heuristic_summary(self, c: Dict, idx: int, pid: str, index: Optional[VerificationIndex]):
+        """Chunk left out by the relevance filter: heuristic summary, rule-based check only."""
+        summ = heuristic_summarize(c['text'], f"{pid}_chunk_{idx}")
+        return summ, verify_summary_factuality(summ, [c], index=index, chunk_idx=idx), {'rule_passed': 0, 'escalated': 0}
 
-        # 1) Retrieval
-        print("🔍 Querying arXiv...")
-        try:
-            papers_meta = query_arxiv(query, max_results=max_results)
-            print(f"✅ Retrieved {len(papers_meta)} papers")
-        except Exception as e:
-            print("❌ arXiv FAILED:", e)
-            return {"error": "arXiv query failed", "details": str(e)}
-
-        outputs = []
-
-        for p_idx, p in enumerate(papers_meta):
-            print(f"\n===============================")
-            print(f"📄 PROCESSING PAPER {p_idx+1}/{len(papers_meta)}")
-            print("📝 Title:", p.get("title", "N/A"))
-            print("===============================\n")
-
-            pdf_url = p.get('pdf_url')
-            pid = p.get('id') or pdf_url
-            title = p.get('title')
-            authors = p.get('authors')
-            published = p.get('published')
-
-            meta_cache = self._read_meta()
-            cached = meta_cache['papers'].get(pid)
-
-            # 2) download / cache
-            print("⬇️  Downloading / using cached PDF...")
-            if cached and Path(cached.get('local_path', '')).exists():
-                pdf_path = cached['local_path']
-                print("✅ Using cached PDF:", pdf_path)
+    def _relevance_stats(self, chunks: List[Dict], picked: Dict, top_k: int, token_budget: int) -> Dict:
+        selected = set(picked['selected'])
+        skipped_tokens = sum(c.get('tokens', 0) for i, c in enumerate(chunks) if i not in selected)
+        # each skipped chunk would have been sent to the summarizer, and in 'llm' mode to the evaluator too
+        # (in 'tiered' mode this is a lower bound)
+        calls_per_chunk = 2 if self.verification_mode == 'llm' else 1
+        return {
+            'top_k': top_k,
+            'token_budget': token_budget,
+            'llm_chunks': len(selected),
+            'heuristic_chunks': len(chunks) - len(selected),
+            'chunk_tokens_skipped': skipped_tokens,
+            'llm_tokens_saved': skipped_tokens * calls_per_chunk,
+            'scores': [round(s, 4) for s in picked['scores']],
+        }
+
+    def _summarize_with_retries(self, c: Dict, idx: int, pid: str, first: Optional[Dict],
+                                index: Optional[VerificationIndex], budget: Optional[TokenBudget] = None):
+        retries = 0
+        vstats = {'rule_passed': 0, 'escalated': 0}
+        while True:
+            # 1. Run summarizer
+            if first is not None and retries == 0:
+                summ, source = first
             else:
-                try:
-                    pdf_path = download_pdf(pdf_url, self.tmp_dir)
-                    meta_cache['papers'][pid] = {'local_path': pdf_path, 'title': title, 'pdf_url': pdf_url}
-                    self._write_meta(meta_cache)
-                    print("✅ Downloaded:", pdf_path)
-                except Exception as e:
-                    print("❌ PDF download failed:", e)
-                    pdf_path = None
+                # a retry must reach the model: the cached response is the one that just failed
+                summ, source = summarize_chunk_with_source(c['text'], f"{pid}_chunk_{idx}", budget=budget,
+                                                           use_cache=retries == 0)
+
+            # 2. Run evaluator
+            v = self._verify(c, idx, summ, index, vstats, budget)
+
+            if v.get("ok", False) is True:
+                break
+
+            if retries == 0 and first is None and source == 'llm':
+                forget_chunk_summary(c['text'])   # later runs must not replay the rejected response
+            print(f"⚠️ Evaluation failed for chunk {idx+1}, retrying summarization...")
+
+            retries += 1
+            if retries > MAX_RETRIES:
+                print(f"❌ Summary failed after {MAX_RETRIES+1} attempts — keeping last version.")
+                break
+
+        # meant for the LLM but summarized heuristically (LLM error, unparseable output)
+        vstats['heuristic_fallback'] = bool(GEMINI_KEY) and source == 'heuristic'
+        # an LLM summary that never passed evaluation: worth asking for again next run
+        vstats['rejected'] = source == 'llm' and v.get("ok", False) is not True
+        return summ, v, retries, vstats
 
-            # 3) extract text
+    def _verify(self, c: Dict, idx: int, summ: Dict, index: Optional[VerificationIndex], vstats: Dict,
+                budget: Optional[TokenBudget] = None) -> Dict:
+        rule = None
+        if self.verification_mode == 'tiered':
+            rule = verify_summary_factuality(summ, [c], index=index, chunk_idx=idx)
+            # confident pass: every evidence snippet / result value was found in this chunk, and at least one
+            # snippet with words in it was found verbatim -- numbers alone are too easy to match by chance
+            if rule['ok'] and rule['grounded'] > 0:
+                vstats['rule_passed'] += 1
+                METRICS.inc('rc_verifications_total', help='Chunk verifications by deciding tier', tier='rule')
+                return rule
+        vstats['escalated'] += 1
+        METRICS.inc('rc_verifications_total', help='Chunk verifications by deciding tier', tier='llm')
+        # LLM evaluator, fallback to rule-based (also when the token budget is spent)
+        try:
+            return evaluate_summary_llm(c['text'], summ, budget=budget)
+        except:
+            return rule or verify_summary_factuality(summ, [c], index=index, chunk_idx=idx)
+
+    def _cached_pdf_path(self, p: Dict) -> Optional[str]:
+        pdf_url = p.get('pdf_url')
+        cached = self.meta_store.get(p.get('id') or pdf_url) or self.meta_store.get_by_url(pdf_url)
+        if cached and Path(cached.get('local_path', '')).exists():
+            return cached['local_path']
+        return None
+
+    def _process_paper(self, p_idx: int, p: Dict, n_papers: int, chunk_pool: Optional[ThreadPoolExecutor],
+                       emit: Optional[Callable[[Dict], None]] = None, query: str = '',
+                       chunk_top_k: int = 0, chunk_token_budget: int = 0, budget: Optional[TokenBudget] = None):
+        """
+        Run the full per-paper pipeline (download → extract → chunk → summarize).
+        With chunk_top_k / chunk_token_budget, only the chunks most relevant to query are LLM-summarized.
+        budget: the paper's TokenBudget scope; chunk calls get 1 - BUDGET_PAPER_SUMMARY_SHARE of it
+        (split evenly over the LLM-summarized chunks), the paper summary whatever they leave.
+        Returns (output_record, stage_timings); emit() receives a progress event after each stage.
+        """
+        timings = {}
+        t = time.perf_counter()
+
+        def lap(stage):
+            nonlocal t
+            now = time.perf_counter()
+            timings[stage] = round(now - t, 4)
+            t = now
+            record(stage, timings[stage], paper_id=pid)
+            if emit:
+                emit({'event': 'progress', 'stage': stage, 'paper_index': p_idx,
+                      'paper_id': pid, 'seconds': timings[stage]})
+
+        print(f"\n===============================")
+        print(f"📄 PROCESSING PAPER {p_idx+1}/{n_papers}")
+        print("📝 Title:", p.get("title", "N/A"))
+        print("===============================\n")
+
+        pdf_url = p.get('pdf_url')
+        pid = p.get('id') or pdf_url
+        title = p.get('title')
+        authors = p.get('authors')
+        published = p.get('published')
+
+        # 2) download / cache
+        print("⬇️  Downloading / using cached PDF...")
+        pdf_path = self._cached_pdf_path(p)
+        if pdf_path:
+            print("✅ Using cached PDF:", pdf_path)
+        else:
+            try:
+                # joins the transfer run_iter prefetched, if it is still in flight
+                pdf_path = download_pdf(pdf_url, self.tmp_dir)
+                self.meta_store.upsert(pid, {'local_path': pdf_path, 'title': title, 'pdf_url': pdf_url})
+                print("✅ Downloaded:", pdf_path)
+            except Exception as e:
+                print("❌ PDF download failed:", e)
+                pdf_path = None
+        lap('download')
+
+        # derived artifacts are cached per PDF content hash; any stage found on disk skips
+        # itself and every stage before it
+        doc_hash = None
+        if pdf_path and self.artifacts is not None:
+            try:
+                doc_hash = file_sha256(pdf_path)
+            except OSError as e:
+                print("⚠️ Could not hash PDF:", e)
+        filtering = chunk_top_k > 0 or chunk_token_budget > 0
+        relevance_key = (' '.join(query.lower().split()), chunk_top_k, chunk_token_budget) if filtering else None
+        fps = self._stage_fingerprints({'title': title, 'authors': authors, 'published': published}, relevance_key)
+        cached_stages = []
+
+        def load(stage):
+            if doc_hash is None:
+                return None
+            value = self.artifacts.get(doc_hash, stage, fps[stage])
+            if value is not None:
+                cached_stages.append(stage)
+            return value
+
+        def save(stage, value):
+            if doc_hash is not None:
+                self.artifacts.put(doc_hash, stage, fps[stage], value)
+
+        summaries = load('summaries')
+        paper_summary = load('paper_summary') if summaries is not None else None
+        chunks = load('chunks') if summaries is None else None
+        combined = load('sections') if summaries is None and chunks is None else None
+        cleaned = load('text') if summaries is None and chunks is None and combined is None else None
+        if cached_stages:
+            print("♻️  Using cached stages:", ", ".join(cached_stages))
+
+        from_abstract = False
+        # 3) extract + clean text, page by page (no raw full-document string);
+        #    in layout mode this yields the kept sections directly
+        if summaries is None and chunks is None and combined is None and cleaned is None:
             print("📖 Extracting PDF text...")
             if pdf_path:
                 try:
-                    raw = extract_text_from_pdf(pdf_path)
-                    print(f"✅ Extracted {len(raw)} characters")
+                    if self.section_extractor == 'layout':
+                        cleaned = extract_layout_sections(pdf_path)
+                        print(f"✅ Extracted {len(cleaned)} sections, "
+                              f"{sum(len(s['text']) for s in cleaned)} characters")
+                    else:
+                        cleaned = extract_clean_text(pdf_path)
+                        print(f"✅ Extracted {len(cleaned)} characters")
+                    save('text', cleaned)
                 except Exception as e:
                     print("❌ PDF extraction failed:", e)
-                    raw = p.get('summary', '')
+                    cleaned = clean_text(p.get('summary', ''))
+                    from_abstract = True
+                    doc_hash = None   # abstract-derived outputs must not be cached under the PDF
             else:
-                raw = p.get('summary', '')
+                cleaned = clean_text(p.get('summary', ''))
+                from_abstract = True
                 print("⚠️ Using abstract instead")
+        lap('extract')
 
-            # 4) clean + section
-            print("🧹 Cleaning + sectioning...")
-            cleaned = clean_text(raw)
-            sections = naive_section_split(cleaned)
-            combined = '\n'.join(s.get('text', '') for s in sections)
+        # 4) section
+        if summaries is None and chunks is None and combined is None:
+            print("🧹 Sectioning...")
+            if isinstance(cleaned, list):
+                combined = cleaned   # layout sections
+            else:
+                sections = naive_section_split(cleaned)
+                combined = '\n'.join(s.get('text', '') for s in sections)
+            save('sections', combined)
+        lap('clean_section')
 
-            # 5) chunking
+        # 5) chunking
+        if summaries is None and chunks is None:
             print("🧩 Chunking...")
             # chunks = chunk_text_by_tokens(combined, max_tokens=800, overlap=100)
             # chunks = chunk_text_by_tokens(combined)
-            chunks = section_chunker(combined, max_tokens=3000)
+            kept = combined if isinstance(combined, list) else split_kept_sections(combined)
+            if self.chunker == 'sentence':
+                chunks = sentence_chunker(kept, max_tokens=CHUNK_MAX_TOKENS, overlap=CHUNK_OVERLAP_TOKENS)
+            else:
+                chunks = chunk_sections(kept, max_tokens=CHUNK_MAX_TOKENS, split=self.chunk_split,
+                                        overlap=CHUNK_OVERLAP_TOKENS)
+            save('chunks', chunks)
 
             print(f"✅ Total chunks: {len(chunks)}")
+        lap('chunk')
 
-            # 6) per-chunk summaries + verification
-            chunk_summaries = []
-            verifications = []
-            # for idx, c in enumerate(chunks[:3]):
-            #     print(f"🧠 Summarizing chunk {idx+1}/{min(3, len(chunks))}")
-            # for idx, c in enumerate(chunks):
-            #     print(f"🧠 Summarizing chunk {idx+1}/{len(chunks)}")
-            #     summ = summarize_chunk(c['text'], f"{pid}_chunk_{idx}")
-            #     try :
-            #         v = evaluate_summary_llm(summ, chunks)
-            #     except:
-            #         v = verify_summary_factuality(summ, chunks)
-            #     chunk_summaries.append(summ)
-            #     verifications.append(v)
-            MAX_RETRIES = 1   # run summarization again if evaluation fails
-
+        # 6) per-chunk summaries + verification (fanned out, results kept in chunk order)
+        degraded = False
+        if summaries is None:
+            # batched mode: several chunks share one summarize request; evaluation stays per chunk
+            index = VerificationIndex(chunks)
+            # relevance pre-filter: only the selected chunks reach the LLM, the rest are summarized heuristically
+            llm_idx = list(range(len(chunks)))
+            relevance = None
+            if filtering and chunks:
+                picked = select_chunks(query, chunks, chunk_top_k, chunk_token_budget)
+                llm_idx = picked['selected']
+                relevance = self._relevance_stats(chunks, picked, chunk_top_k, chunk_token_budget)
+                print(f"🎯 Relevance filter: {len(llm_idx)}/{len(chunks)} chunks to the LLM")
+                METRICS.inc('rc_relevance_chunks_total', len(llm_idx), help='Chunks by summarizer route', route='llm')
+                METRICS.inc('rc_relevance_chunks_total', len(chunks) - len(llm_idx),
+                            help='Chunks by summarizer route', route='heuristic')
+                METRICS.inc('rc_llm_tokens_saved_total', relevance['llm_tokens_saved'],
+                            help='Estimated LLM input tokens not sent because of the relevance filter')
+            chunks_budget = budget.child('chunks', 1 - BUDGET_PAPER_SUMMARY_SHARE) if budget is not None else None
+            firsts = [None] * len(chunks)
+            if self.summary_batch_tokens > 0 and len(llm_idx) > 1:
+                batched = summarize_chunks_batched(
+                    [(chunks[idx]['text'], f"{pid}_chunk_{idx}") for idx in llm_idx],
+                    token_budget=self.summary_batch_tokens,
+                    budget=chunks_budget,
+                    with_source=True,
+                )
+                for idx, first in zip(llm_idx, batched):
+                    firsts[idx] = first
+            # what the batched requests left is shared out evenly, so early chunks cannot starve late ones
+            chunk_budgets = dict(zip(llm_idx, chunks_budget.split([f"chunk_{idx}" for idx in llm_idx])
+                                     if chunks_budget is not None else [None] * len(llm_idx)))
+            futures = {}
+            if chunk_pool is not None and len(llm_idx) > 1:
+                futures = {idx: chunk_pool.submit(bind(self._summarize_and_verify), chunks[idx], idx, len(chunks),
+                                                  pid, firsts[idx], index, chunk_budgets[idx])
+                           for idx in llm_idx}
+            llm_set = set(llm_idx)
+            results = []
             for idx, c in enumerate(chunks):
-                print(f"🧠 Summarizing chunk {idx+1}/{len(chunks)}")
-
-                retries = 0
-                while True:
-                    # 1. Run summarizer
-                    summ = summarize_chunk(c['text'], f"{pid}_chunk_{idx}")
-
-                    # 2. Run evaluator (LLM first, fallback to rule-based)
-                    try:
-                        v = evaluate_summary_llm(c['text'], summ)
-                    except:
-                        v = verify_summary_factuality(summ, c['text'])
-
-                    if v.get("ok", False) is True:
-                        break
-
-                    print(f"⚠️ Evaluation failed for chunk {idx+1}, retrying summarization...")
-
-                    retries += 1
-                    if retries > MAX_RETRIES:
-                        print(f"❌ Summary failed after {MAX_RETRIES+1} attempts — keeping last version.")
-                        break
+                if idx in futures:
+                    results.append(futures[idx].result())
+                elif idx in llm_set:
+                    results.append(self._summarize_and_verify(c, idx, len(chunks), pid, firsts[idx], index,
+                                                              chunk_budgets[idx]))
+                else:
+                    results.append(self._heuristic_summary(c, idx, pid, index))
+            summaries = {
+                'chunk_summaries': [summ for summ, _, _ in results],
+                'verifications': [v for _, v, _ in results],
+                'verification_stats': self._verification_stats([vs for _, _, vs in results]),
+            }
+            if relevance:
+                summaries['relevance'] = relevance
+            # summaries the budget cut short, that fell back to the heuristic on a passing LLM failure,
+            # or that the evaluator kept rejecting are not what the fingerprint promises: recompute them next run
+            degraded = ((chunks_budget is not None and chunks_budget.limited)
+                        or any(vs.get('heuristic_fallback') or vs.get('rejected') for _, _, vs in results))
+            if not degraded:
+                save('summaries', summaries)
+        chunk_summaries = summaries['chunk_summaries']
+        verifications = summaries['verifications']
+        verification_stats = summaries['verification_stats']
+        lap('summarize')
 
-                chunk_summaries.append(summ)
-                verifications.append(v)
-
-
-            # 7) paper-level summary
+        # 7) paper-level summary
+        paper_degraded = False
+        if paper_summary is None:
             print("📚 Aggregating chunk summaries into paper-level summary...")
-            paper_summary = summarize_paper_from_chunks(
+            summary_budget = budget.child('paper_summary') if budget is not None else None
+            paper_summary, source = summarize_paper_with_source(
                 chunk_summaries,
                 {
                     "paper_id": pid,
@@ -164,41 +440,246 @@ class Orchestrator:
                     "authors": authors,
                     "published": published,
                 },
+                budget=summary_budget,
             )
+            paper_degraded = ((summary_budget is not None and summary_budget.limited)
+                              or bool(GEMINI_KEY) and source == 'heuristic')
+            if not (degraded or paper_degraded):
+                save('paper_summary', paper_summary)
+        lap('paper_summary')
+        timings['cached_stages'] = cached_stages
+
+        out = {
+            'paper_id': pid,
+            'title': title,
+            'authors': authors,
+            'published': published,
+            'pdf_url': pdf_url,
+            'chunk_summaries': chunk_summaries,
+            'verifications': verifications,
+            'verification_stats': verification_stats,
+            'paper_summary': paper_summary,
+        }
+        if summaries.get('relevance'):
+            out['relevance'] = summaries['relevance']
+        if budget is not None:
+            out['llm_budget'] = budget.report()
+        # run_local serves this record until a complete one (full text, every chunk through an
+        # unconstrained LLM) replaces it
+        complete = not (from_abstract or summaries.get('relevance') or degraded or paper_degraded)
+        if self.local_index is not None and self.local_index.wants(pid, complete):
+            if chunks is None and doc_hash is not None:
+                chunks = self.artifacts.get(doc_hash, 'chunks', fps['chunks'])
+            try:
+                self.local_index.add_paper(out, chunks, complete=complete)
+            except Exception as e:
+                print("⚠️ Could not add paper to the local index:", e)
+        return out, timings
+
+    def _verification_stats(self, per_chunk: List[Dict]) -> Dict:
+        rule_passed = sum(vs['rule_passed'] for vs in per_chunk)
+        escalated = sum(vs['escalated'] for vs in per_chunk)
+        evaluations = rule_passed + escalated
+        return {
+            'mode': self.verification_mode,
+            'evaluations': evaluations,
+            'rule_passed': rule_passed,
+            'escalated': escalated,
+            'escalation_rate': round(escalated / evaluations, 4) if evaluations else 0.0,
+            'llm_calls_saved': rule_passed,
+        }
+
+    def run_iter(self, query: str, max_results: int = 3, max_workers: Optional[int] = None,
+                 include_trace: bool = False, chunk_top_k: int = RELEVANCE_TOP_K,
+                 chunk_token_budget: int = RELEVANCE_TOKEN_BUDGET,
+                 llm_token_budget: int = QUERY_TOKEN_BUDGET) -> Iterator[Dict]:
+        """
+        Streaming form of run(). Yields events as the pipeline advances:
+          {'event': 'progress', 'stage': ...}           after retrieval, every paper stage and the corpus stage
+          {'event': 'paper', 'index': i, 'paper': ...}  as soon as a paper's paper_summary is ready
+          {'event': 'result', ...}                      corpus-level sections (everything but 'papers')
+          {'event': 'error', ...}                       if retrieval fails
+        Papers may arrive out of order; 'index' is their position in the final result.
+        With include_trace, the result event carries a span-level timing breakdown under 'trace'.
+        chunk_top_k / chunk_token_budget (0 = off) limit which chunks of each paper are LLM-summarized;
+        the result event then reports the totals under 'relevance'.
+        llm_token_budget (0 = unlimited) caps the prompt + output tokens of every LLM call the query
+        makes: papers split all but BUDGET_CORPUS_SHARE evenly, the corpus stage gets what is left,
+        and calls that no longer fit fall back to the heuristics. Usage is reported under 'llm_budget'.
+        """
+        start_time = time.time()
+        METRICS.inc('rc_queries_total', help='Queries started')
+        # spans reach the trace through a context variable, which is set per unit of work
+        # (run_in_trace) because this generator may be resumed from different threads
+        trace = new_trace() if include_trace else None
+        workers = max(1, max_workers or self.max_workers)
+        print("\n============================")
+        print("🚀 ORCHESTRATOR STARTED")
+        print("📌 Query:", query)
+        print("📄 Max papers:", max_results)
+        print("🧵 Workers:", workers)
+        print("============================\n")
+
+        # 1) Retrieval
+        t0 = time.perf_counter()
+        print("🔍 Querying arXiv...")
+        def retrieve():
+            with span('retrieval', max_results=max_results):
+                return query_arxiv(query, max_results=max_results)
 
-            outputs.append({
-                'paper_id': pid,
-                'title': title,
-                'authors': authors,
-                'published': published,
-                'pdf_url': pdf_url,
-                'chunk_summaries': chunk_summaries,
-                'verifications': verifications,
-                'paper_summary': paper_summary,
-            })
-        # print("\n============================")
-        # print("OUTPUT : ", outputs)
-        # print("\n============================")
-        # 8) corpus-level aggregation
-        all_chunk_summaries = [s for p in outputs for s in p['chunk_summaries']]
-        aggregate = aggregate_summaries(all_chunk_summaries)
-        comparison = build_method_comparison(outputs)
-        research_gaps = detect_research_gaps([p['paper_summary'] for p in outputs])
         try:
-            ranking = rank_papers_llm(outputs)
-        except:
-            ranking = rank_papers(outputs)
-        references = build_references(outputs)
+            papers_meta = run_in_trace(trace, retrieve)
+            print(f"✅ Retrieved {len(papers_meta)} papers")
+        except Exception as e:
+            print("❌ arXiv FAILED:", e)
+            yield {"event": "error", "error": "arXiv query failed", "details": str(e)}
+            return
+        t_retrieval = time.perf_counter() - t0
+        yield {'event': 'progress', 'stage': 'retrieval', 'papers': len(papers_meta),
+               'seconds': round(t_retrieval, 4)}
+
+        budget = TokenBudget(llm_token_budget) if llm_token_budget > 0 else None
+        paper_budgets = (budget.child('papers', 1 - BUDGET_CORPUS_SHARE).split(
+                             [p.get('id') or p.get('pdf_url') for p in papers_meta])
+                         if budget is not None else [None] * len(papers_meta))
+
+        # 2-7) per-paper pipelines on worker threads; their events are relayed through a queue
+        t0 = time.perf_counter()
+        events: "queue.Queue[Dict]" = queue.Queue()
+
+        def process(p_idx, p, chunk_pool):
+            with span('paper', paper_id=p.get('id') or p.get('pdf_url'), paper_index=p_idx):
+                return self._process_paper(p_idx, p, len(papers_meta), chunk_pool, emit=events.put, query=query,
+                                           chunk_top_k=chunk_top_k, chunk_token_budget=chunk_token_budget,
+                                           budget=paper_budgets[p_idx])
+
+        def paper_task(p_idx, p, chunk_pool):
+            try:
+                out, tm = run_in_trace(trace, process, p_idx, p, chunk_pool)
+                events.put({'event': '_done', 'index': p_idx, 'paper': out, 'timings': tm})
+            except BaseException as e:
+                events.put({'event': '_failed', 'index': p_idx, 'exc': e})
+
+        paper_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='paper')
+        chunk_pool = (ThreadPoolExecutor(max_workers=self.chunk_workers, thread_name_prefix='chunk')
+                      if workers > 1 else None)
+        outputs: List[Optional[Dict]] = [None] * len(papers_meta)
+        paper_timings: List[Dict] = [{} for _ in papers_meta]
+        try:
+            # start every missing PDF now, so papers waiting for a worker don't also wait for their download
+            prefetch_pdfs([p['pdf_url'] for p in papers_meta
+                           if p.get('pdf_url') and not self._cached_pdf_path(p)], self.tmp_dir)
+            for p_idx, p in enumerate(papers_meta):
+                paper_pool.submit(paper_task, p_idx, p, chunk_pool)
+            remaining = len(papers_meta)
+            while remaining:
+                ev = events.get()
+                if ev['event'] == '_failed':
+                    raise ev['exc']
+                if ev['event'] == '_done':
+                    remaining -= 1
+                    outputs[ev['index']] = ev['paper']
+                    paper_timings[ev['index']] = ev['timings']
+                    yield {'event': 'paper', 'index': ev['index'], 'paper': ev['paper']}
+                else:
+                    yield ev
+        finally:
+            # on early close (client went away) drop queued papers instead of finishing them
+            paper_pool.shutdown(wait=False, cancel_futures=True)
+            if chunk_pool is not None:
+                chunk_pool.shutdown(wait=False, cancel_futures=True)
+        t_papers = time.perf_counter() - t0
+
+        # 8) corpus-level aggregation
+        t0 = time.perf_counter()
+
+        def corpus():
+            with span('corpus', papers=len(outputs)):
+                return self._corpus(outputs, budget=budget.child('corpus') if budget is not None else None)
+
+        aggregate, comparison, research_gaps, ranking, references = run_in_trace(trace, corpus)
+        t_corpus = time.perf_counter() - t0
+        yield {'event': 'progress', 'stage': 'corpus', 'seconds': round(t_corpus, 4)}
+
+        # summed per-paper stage time vs wall-clock time shows the parallel speedup
+        stage_totals = {stage: round(sum(tm.get(stage, 0.0) for tm in paper_timings), 4)
+                        for stage in PAPER_STAGES}
+        timings = {
+            'workers': workers,
+            'retrieval': round(t_retrieval, 4),
+            'papers_wall': round(t_papers, 4),
+            'papers_sequential': round(sum(stage_totals.values()), 4),
+            'corpus': round(t_corpus, 4),
+            'stage_totals': stage_totals,
+            'per_paper': paper_timings,
+        }
 
         elapsed = round(time.time() - start_time, 2)
+        run_in_trace(trace, record, 'query', time.time() - start_time, papers=len(outputs))
         print("\n============================")
         print("✅ ORCHESTRATOR FINISHED")
         print("⏱ Elapsed time:", elapsed, "seconds")
         print("============================\n")
 
-        return {
+        yield {
+            'event': 'result',
             'query': query,
             'runtime_seconds': elapsed,
+            'timings': timings,
+            'aggregate': aggregate,
+            'comparison': comparison,
+            'research_gaps': research_gaps,
+            'ranking': ranking,
+            'references': references,
+            **({'relevance': self._relevance_totals(outputs)} if chunk_top_k > 0 or chunk_token_budget > 0 else {}),
+            **({'llm_budget': budget.report(depth=2)} if budget is not None else {}),
+            **({'trace': trace.breakdown()} if trace is not None else {}),
+        }
+
+    @staticmethod
+    def _relevance_totals(outputs: List[Dict]) -> Dict:
+        stats = [p['relevance'] for p in outputs if p.get('relevance')]
+        return {key: sum(s[key] for s in stats)
+                for key in ('llm_chunks', 'heuristic_chunks', 'chunk_tokens_skipped', 'llm_tokens_saved')}
+
+    def _corpus(self, outputs: List[Dict], use_llm: bool = True, budget: Optional[TokenBudget] = None):
+        """budget: the corpus TokenBudget scope; research gaps may use half, ranking the rest."""
+        all_chunk_summaries = [s for p in outputs for s in p['chunk_summaries']]
+        aggregate = aggregate_summaries(all_chunk_summaries)
+        comparison = build_method_comparison(outputs)
+        research_gaps = detect_research_gaps([p['paper_summary'] for p in outputs], use_llm=use_llm,
+                                             budget=budget.child('research_gaps', 0.5) if budget is not None else None)
+        if use_llm:
+            try:
+                ranking = rank_papers_llm(outputs, budget=budget.child('ranking') if budget is not None else None)
+            except:
+                ranking = rank_papers(outputs)
+        else:
+            ranking = rank_papers(outputs)
+        references = build_references(outputs)
+        return aggregate, comparison, research_gaps, ranking, references
+
+    def run_local(self, query: str, max_results: int = 3) -> Dict:
+        """
+        Answer from the local index of already-processed papers: no arXiv, downloads or LLM calls.
+        Same result shape as run(), plus 'source' and each paper's index 'score' / 'hits'.
+        """
+        if self.local_index is None:
+            return {'error': 'local index disabled', 'details': 'set LOCAL_INDEX_ENABLED=1'}
+        t0 = time.perf_counter()
+        with span('local_search', max_results=max_results):
+            found = self.local_index.search(query, max_results=max_results)
+        t_search = time.perf_counter() - t0
+        outputs = [dict(hit['paper'], score=hit['score'], hits=hit['hits']) for hit in found]
+        t0 = time.perf_counter()
+        aggregate, comparison, research_gaps, ranking, references = self._corpus(outputs, use_llm=False)
+        t_corpus = time.perf_counter() - t0
+        METRICS.inc('rc_query_requests_total', help='Query runs by how they were served', outcome='local')
+        return {
+            'query': query,
+            'source': 'local',
+            'runtime_seconds': round(t_search + t_corpus, 4),
+            'timings': {'search': round(t_search, 4), 'corpus': round(t_corpus, 4)},
             'papers': outputs,
             'aggregate': aggregate,
             'comparison': comparison,
@@ -206,3 +687,74 @@ class Orchestrator:
             'ranking': ranking,
             'references': references,
         }
+
+    def run(self, query: str, max_results: int = 3, max_workers: Optional[int] = None,
+            include_trace: bool = False, on_event: Optional[Callable[[Dict], None]] = None,
+            chunk_top_k: int = RELEVANCE_TOP_K, chunk_token_budget: int = RELEVANCE_TOKEN_BUDGET,
+            llm_token_budget: int = QUERY_TOKEN_BUDGET) -> Dict:
+        """
+        Run the whole pipeline and return the assembled result; on_event() sees every run_iter event.
+        A query already being computed is joined instead of started again, and a recent
+        successful result is returned from the cache (on_event is not called in either case).
+        """
+        key = (' '.join(query.lower().split()), max_results, include_trace, chunk_top_k, chunk_token_budget,
+               llm_token_budget)
+        cached = self.results.get(key)
+        if cached is not None:
+            METRICS.inc('rc_query_requests_total', help='Query runs by how they were served', outcome='cached')
+            return copy.deepcopy(cached)
+        with self._inflight_lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if not owner:
+            METRICS.inc('rc_query_requests_total', help='Query runs by how they were served', outcome='coalesced')
+            return copy.deepcopy(fut.result())
+
+        METRICS.inc('rc_query_requests_total', help='Query runs by how they were served', outcome='computed')
+        try:
+            result = self._run(query, max_results, max_workers, include_trace, on_event,
+                               chunk_top_k, chunk_token_budget, llm_token_budget)
+            if 'error' not in result:
+                self.results.put(key, copy.deepcopy(result))
+            fut.set_result(result)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        return result
+
+    def _run(self, query: str, max_results: int, max_workers: Optional[int], include_trace: bool,
+             on_event: Optional[Callable[[Dict], None]], chunk_top_k: int, chunk_token_budget: int,
+             llm_token_budget: int) -> Dict:
+        papers: Dict[int, Dict] = {}
+        for ev in self.run_iter(query, max_results=max_results, max_workers=max_workers,
+                                include_trace=include_trace, chunk_top_k=chunk_top_k,
+                                chunk_token_budget=chunk_token_budget, llm_token_budget=llm_token_budget):
+            if on_event:
+                on_event(ev)
+            if ev['event'] == 'error':
+                return {k: v for k, v in ev.items() if k != 'event'}
+            if ev['event'] == 'paper':
+                papers[ev['index']] = ev['paper']
+            elif ev['event'] == 'result':
+                final = ev
+
+        result = {
+            'query': final['query'],
+            'runtime_seconds': final['runtime_seconds'],
+            'timings': final['timings'],
+            'papers': [papers[i] for i in sorted(papers)],
+            'aggregate': final['aggregate'],
+            'comparison': final['comparison'],
+            'research_gaps': final['research_gaps'],
+            'ranking': final['ranking'],
+            'references': final['references'],
+        }
+        for key in ('relevance', 'llm_budget', 'trace'):
+            if key in final:
+                result[key] = final[key]
+        return result
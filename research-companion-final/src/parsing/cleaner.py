@@ -1,7 +1,33 @@
 import re
+from typing import Iterable, Iterator
+from src.parsing.pdf_extractor import extract_pages, iter_without_headers_footers
+
+# \cite{..}, \ref{..} and numeric [1], [2, 3] citations in one alternation. The bracket form
+# allows any whitespace between numbers, so it can run on raw page text, whose whitespace
+# has not been collapsed yet, and matches what the old single-space pattern matched on
+# collapsed text.
+_CITATION_RE = re.compile(r'\\cite\{[^}]*\}|\\ref\{[^}]*\}|\[[0-9]+(?:(?:,\s*|\s+)[0-9]+)*,?\s*\]')
+_WS_RE = re.compile(r'\s+')
+
+
 def clean_text(text: str) -> str:
-    text = re.sub(r'\\cite\{.*?\}', '', text)
-    text = re.sub(r'\\ref\{.*?\}', '', text)
-    text = re.sub(r'\[(?:[0-9]{1,3},?\s?)+\]', '', text)
-    text = re.sub(r'\s+', ' ', text)
+    text = _CITATION_RE.sub('', text)
+    text = _WS_RE.sub(' ', text)
     return text.strip()
+
+
+def normalize_pages(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Clean page by page: ' '.join(normalize_pages(pages)) equals clean_text('\\n'.join(pages))
+    without building the raw full-document string (a citation split across a page break
+    is the only thing left in place). Empty pages yield nothing.
+    """
+    for page in pages:
+        page = clean_text(page)
+        if page:
+            yield page
+
+
+def extract_clean_text(path: str) -> str:
+    """extract_text_from_pdf + clean_text, streamed per page instead of as whole-document rewrites."""
+    return ' '.join(normalize_pages(iter_without_headers_footers(extract_pages(path))))
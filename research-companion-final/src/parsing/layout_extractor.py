@@ -0,0 +1,126 @@
+"""
+Layout-aware section extraction: headings are recognised from PyMuPDF block/font
+metadata while pages are read, text under dropped sections (see section_chunker's
+DROP_SECTIONS) is never collected, and reading stops at the References heading.
+
+The result is the same [{'title', 'text'}] list naive_section_split returns, with
+one line per (cleaned) paragraph block or sub-heading, and goes straight to
+section_chunker.chunk_sections: section boundaries come from the layout, so a
+paragraph that happens to start with "Model ..." is never taken for a heading.
+"""
+import fitz, re
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+from src.parsing.cleaner import clean_text
+from src.parsing.pdf_extractor import _get_pool
+from src.chunking.section_chunker import KEEP_RE, DROP_RE
+
+STOP_RE = re.compile(r'^(?:\d+\.?\s+)?(?:references|bibliography)\b', re.I)
+SUBSECTION_RE = re.compile(r'^\d+\.\d')   # "2.1 ..." never ends a dropped "2 ..." section
+
+HEADING_MAX_CHARS = 120
+HEADING_MAX_WORDS = 12
+MARGIN = 0.06   # top/bottom fraction of the page treated as running header / footer area
+BOLD = 16       # PyMuPDF span flag
+# fonts whose bold weight is only visible in the name (e.g. Computer Modern CMBX, Times -Medi)
+BOLD_FONT_RE = re.compile(r'bold|black|heavy|semibold|demi|-medi|^cmbx|cmb\d', re.I)
+
+
+def _block_lines(block: Dict):
+    """Horizontal lines of a text block as lists of spans (rotated margin stamps are ignored)."""
+    for line in block.get('lines', []):
+        dx, dy = line.get('dir', (1.0, 0.0))
+        if abs(dy) > 0.01 or dx <= 0:
+            continue
+        yield line['spans']
+
+
+def _is_heading(spans, text: str, body_size: float) -> bool:
+    if not text or len(text) > HEADING_MAX_CHARS or len(text.split()) > HEADING_MAX_WORDS:
+        return False
+    if not re.search(r'[^\W\d_]{2}', text):
+        return False   # axis ticks, table numbers
+    styled = [s for s in spans if s['text'].strip()]
+    if not styled:
+        return False
+    bold = all(s['flags'] & BOLD or BOLD_FONT_RE.search(s['font']) for s in styled)
+    larger = min(s['size'] for s in styled) >= body_size + 1.0
+    return larger or (bold and max(s['size'] for s in styled) >= body_size - 0.5)
+
+
+def iter_layout_lines(doc) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (kind, line) for the kept parts of doc, one page at a time:
+    'section' for a heading that opens a kept section, 'heading' for any other
+    heading (sub-sections, table captions), 'text' for a paragraph block.
+    A dropped section ends at the next KEEP heading or at any heading set at least as
+    large as the one that opened it (its next sibling), so an unrecognised
+    "3 Proposed Framework" after "2 Related Work" is not lost.
+    Stops without touching the remaining pages once a References heading is seen.
+    """
+    sizes = Counter()   # char-weighted font sizes seen so far -> body text size
+    skip_size = None    # font size of the heading that opened the section being dropped
+    for page in doc:
+        height = page.rect.height
+        blocks = page.get_text('dict', flags=fitz.TEXTFLAGS_TEXT)['blocks']
+        page_blocks = []
+        for b in blocks:
+            spans = [s for line in _block_lines(b) for s in line]
+            if not spans:
+                continue
+            x0, y0, x1, y1 = b['bbox']
+            text = '\n'.join(''.join(s['text'] for s in line) for line in _block_lines(b))
+            if (y1 < height * MARGIN or y0 > height * (1 - MARGIN)) and len(text) < 100:
+                continue   # page numbers, running heads
+            for s in spans:
+                sizes[round(s['size'])] += len(s['text'])
+            page_blocks.append((spans, text))
+        body_size = sizes.most_common(1)[0][0] if sizes else 10
+
+        for spans, text in page_blocks:
+            line = clean_text(text)
+            if not line:
+                continue
+            if _is_heading(spans, line, body_size):
+                size = max(s['size'] for s in spans)
+                if STOP_RE.match(line):
+                    return
+                if DROP_RE.match(line):
+                    skip_size = size
+                    continue
+                if KEEP_RE.match(line) or (skip_size is not None and size >= skip_size - 0.5
+                                         and not SUBSECTION_RE.match(line)):
+                    skip_size = None
+                    yield 'section', line
+                elif skip_size is None:
+                    yield 'heading', line
+            elif skip_size is None:
+                yield 'text', line
+
+
+def _extract_layout_sections(path: str) -> List[Dict]:
+    sections = []
+    title, body = 'abstract', []   # text before the first heading is the title page / abstract
+
+    def flush():
+        if body:
+            sections.append({'title': title, 'text': '\n'.join(body)})
+
+    with fitz.open(path) as doc:
+        for kind, line in iter_layout_lines(doc):
+            if kind == 'section':
+                flush()
+                title, body = line, []
+            else:
+                body.append(line)
+    flush()
+    return sections
+
+
+def extract_layout_sections(path: str) -> List[Dict]:
+    """Kept sections of the PDF as [{'title', 'text'}] (runs in the PDF process pool if configured)."""
+    pool = _get_pool()
+    if pool is None:
+        return _extract_layout_sections(path)
+    return pool.submit(_extract_layout_sections, path).result()
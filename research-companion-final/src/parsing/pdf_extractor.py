@@ -1,33 +1,125 @@
-import fitz, re
-def extract_text_by_page(path: str):
-    doc = fitz.open(path)
-    pages = []
-    for page in doc:
-        pages.append(page.get_text('text'))
-    return pages
-def remove_headers_footers(pages):
-    top_lines=[]; bottom_lines=[]
-    for p in pages:
-        lines=[ln.strip() for ln in p.splitlines() if ln.strip()]
-        if not lines: continue
-        top_lines.append(lines[0]); bottom_lines.append(lines[-1])
-    from collections import Counter
-    top_common = Counter(top_lines).most_common(1)
-    bot_common = Counter(bottom_lines).most_common(1)
+import fitz, re, os, atexit, threading
+import multiprocessing as mp
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+# PyMuPDF holds the GIL while it renders text, so extraction runs in worker processes.
+# 0 disables the pool and extracts in the calling process.
+PDF_EXTRACT_PROCESSES = int(os.getenv('PDF_EXTRACT_PROCESSES', str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '16'))   # page-range size for long documents
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if PDF_EXTRACT_PROCESSES <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                # spawn: forking a process that already runs orchestrator threads is unsafe
+                _pool = ProcessPoolExecutor(max_workers=PDF_EXTRACT_PROCESSES,
+                                            mp_context=mp.get_context('spawn'))
+                atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+    return _pool
+
+
+def extract_text_by_page(path: str, page_range: Optional[Tuple[int, int]] = None):
+    with fitz.open(path) as doc:
+        start, stop = page_range or (0, doc.page_count)
+        return [doc.load_page(i).get_text('text') for i in range(start, min(stop, doc.page_count))]
+
+
+def _page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def _page_ranges(n_pages: int, per_task: int = PDF_PAGES_PER_TASK):
+    per_task = max(1, per_task)
+    return [(i, min(i + per_task, n_pages)) for i in range(0, n_pages, per_task)]
+
+
+def _submit_document(pool: ProcessPoolExecutor, path: str):
+    # long documents are split into page ranges so one thesis can use every worker
+    ranges = _page_ranges(_page_count(path))
+    return [pool.submit(extract_text_by_page, path, r) for r in ranges]
+
+
+def extract_pages(path: str) -> List[str]:
+    """Per-page text, extracted in the process pool when one is configured."""
+    pool = _get_pool()
+    if pool is None:
+        return extract_text_by_page(path)
+    return [page for f in _submit_document(pool, path) for page in f.result()]
+
+
+def iter_without_headers_footers(pages: List[str]) -> Iterator[str]:
+    """Pages with the most common first / last line removed, produced one page at a time."""
+    # split every page once and reuse the lines for both the vote and the trimming
+    page_lines = [p.splitlines() for p in pages]
+    top_lines = Counter(); bottom_lines = Counter()
+    for lines in page_lines:
+        first = next((s for s in (ln.strip() for ln in lines) if s), None)
+        if first is None: continue
+        last = next(s for s in (ln.strip() for ln in reversed(lines)) if s)
+        top_lines[first] += 1; bottom_lines[last] += 1
+    top_common = top_lines.most_common(1)
+    bot_common = bottom_lines.most_common(1)
     top = top_common[0][0] if top_common else None
     bot = bot_common[0][0] if bot_common else None
-    cleaned=[]
-    for p in pages:
-        lines = p.splitlines()
-        if top and lines and lines[0].strip()==top:
-            lines = lines[1:]
-        if bot and lines and lines[-1].strip()==bot:
-            lines = lines[:-1]
-        cleaned.append('\n'.join(lines))
-    return cleaned
-def extract_text_from_pdf(path: str):
-    pages = extract_text_by_page(path)
+    for i, lines in enumerate(page_lines):
+        page_lines[i] = None   # let each page's lines go as soon as it has been emitted
+        start, stop = 0, len(lines)
+        if top and stop and lines[0].strip()==top:
+            start = 1
+        if bot and stop > start and lines[stop-1].strip()==bot:
+            stop -= 1
+        yield '\n'.join(lines[start:stop])
+
+
+def remove_headers_footers(pages):
+    return list(iter_without_headers_footers(pages))
+
+
+def _pages_to_text(pages: List[str]) -> str:
     pages = remove_headers_footers(pages)
     text = '\n'.join(pages)
     text = re.sub(r'\s+', ' ', text)
     return text.strip()
+
+
+def extract_text_from_pdf(path: str):
+    return _pages_to_text(extract_pages(path))
+
+
+def extract_texts_from_pdfs(paths: List[str]) -> List[Optional[str]]:
+    """
+    Batch extraction: every page range of every document is queued on the pool at once.
+    Returns texts in input order; a document that fails to open or parse yields None.
+    """
+    pool = _get_pool()
+    pending = []
+    for path in paths:
+        try:
+            pending.append(_submit_document(pool, path) if pool else None)
+        except Exception as e:
+            print("❌ PDF extraction failed:", path, e)
+            pending.append(e)
+
+    texts: List[Optional[str]] = []
+    for path, futures in zip(paths, pending):
+        if isinstance(futures, Exception):
+            texts.append(None)
+            continue
+        try:
+            pages = (extract_text_by_page(path) if futures is None
+                     else [page for f in futures for page in f.result()])
+            texts.append(_pages_to_text(pages))
+        except Exception as e:
+            print("❌ PDF extraction failed:", path, e)
+            texts.append(None)
+    return texts
@@ -0,0 +1,71 @@
+"""
+Query-aware chunk selection: score a paper's chunks against the query with BM25
+(the paper's own chunks are the collection), weight by section type, and keep the
+best ones that fit top_k / a per-paper token budget. The orchestrator sends only
+those to the LLM summarizer; the rest get heuristic_summarize.
+"""
+import math, os, re
+from collections import Counter
+from typing import Dict, List
+
+from src.retrieval.local_index import terms
+
+RELEVANCE_TOP_K = int(os.getenv('RELEVANCE_TOP_K', '0'))                 # 0: no chunk-count cap
+RELEVANCE_TOKEN_BUDGET = int(os.getenv('RELEVANCE_TOKEN_BUDGET', '0'))   # 0: no per-paper token cap
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# multiplier on the BM25 score by section title; first match wins
+SECTION_WEIGHTS = [
+    (re.compile(r'^(?:\d+\.?\s+)?abstract', re.I), 1.5),
+    (re.compile(r'^(?:\d+\.?\s+)?(?:results?|experiments?|evaluation)', re.I), 1.3),
+    (re.compile(r'^(?:\d+\.?\s+)?(?:method|methodology|model|approach)', re.I), 1.2),
+    (re.compile(r'^(?:\d+\.?\s+)?(?:conclusions?|discussion|limitations?)', re.I), 1.1),
+]
+
+
+def section_weight(title: str) -> float:
+    for pattern, weight in SECTION_WEIGHTS:
+        if pattern.match(title or ''):
+            return weight
+    return 1.0
+
+
+def bm25_scores(query: str, texts: List[str]) -> List[float]:
+    q = set(terms(query))
+    docs = [Counter(terms(t)) for t in texts]
+    if not q or not docs:
+        return [0.0] * len(texts)
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    df = Counter(t for d in docs for t in q if t in d)
+    idf = {t: math.log(1 + (len(docs) - df[t] + 0.5) / (df[t] + 0.5)) for t in q}
+    scores = []
+    for d in docs:
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * sum(d.values()) / avg_len)
+        scores.append(sum(idf[t] * d[t] * (BM25_K1 + 1) / (d[t] + norm) for t in q if t in d))
+    return scores
+
+
+def select_chunks(query: str, chunks: List[Dict], top_k: int = 0, token_budget: int = 0) -> Dict:
+    """
+    Returns {'selected': [chunk indices, in document order], 'scores': [per chunk]}.
+    Chunks are taken best-first until top_k are chosen or the next one would overflow
+    token_budget (0 disables either limit); the best chunk is always selected.
+    """
+    scores = [s * section_weight(c.get('section', ''))
+              for s, c in zip(bm25_scores(query, [c['text'] for c in chunks]), chunks)]
+    if top_k <= 0 and token_budget <= 0:
+        return {'selected': list(range(len(chunks))), 'scores': scores}
+    # ties (e.g. no query term anywhere) keep section weight, then document order
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], -section_weight(chunks[i].get('section', '')), i))
+    selected, used = [], 0
+    for i in ranked:
+        if top_k > 0 and len(selected) >= top_k:
+            break
+        tokens = chunks[i].get('tokens', 0)
+        if token_budget > 0 and selected and used + tokens > token_budget:
+            continue   # a smaller, lower-ranked chunk may still fit
+        selected.append(i)
+        used += tokens
+    return {'selected': sorted(selected), 'scores': scores}
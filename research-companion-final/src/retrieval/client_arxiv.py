@@ -30,14 +30,69 @@
 #     return entries
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from xml.etree import ElementTree as ET
 from urllib.parse import urlencode, quote
-from typing import List, Dict
+from typing import List, Dict, Optional
+import threading
 import time
 import os
 import re
 
+from src.utils.tracing import METRICS
+from src.utils.ttl_cache import TTLCache
+
 ARXIV_BASE = os.getenv('ARXIV_BASE_URL', 'http://export.arxiv.org/api/query')
+ARXIV_TIMEOUT = float(os.getenv('ARXIV_TIMEOUT', '30'))
+# arXiv asks API clients for no more than one request every 3 seconds
+ARXIV_MIN_INTERVAL = float(os.getenv('ARXIV_MIN_INTERVAL', '3.0'))
+ARXIV_CACHE_TTL = float(os.getenv('ARXIV_CACHE_TTL', '3600'))   # seconds; 0 disables the result cache
+ARXIV_CACHE_SIZE = int(os.getenv('ARXIV_CACHE_SIZE', '256'))
+ARXIV_POOL_SIZE = int(os.getenv('ARXIV_POOL_SIZE', '4'))
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """One pooled keep-alive session per process; transient 429/5xx answers are retried with backoff."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                s = requests.Session()
+                retry = Retry(total=3, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset(['GET']))
+                adapter = HTTPAdapter(pool_connections=ARXIV_POOL_SIZE, pool_maxsize=ARXIV_POOL_SIZE,
+                                      max_retries=retry)
+                s.mount('http://', adapter)
+                s.mount('https://', adapter)
+                _session = s
+    return _session
+
+
+class _RateLimiter:
+    """Spaces out requests (not entries) by at least `interval` seconds, across threads."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._next = 0.0
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+_rate_limiter = _RateLimiter(ARXIV_MIN_INTERVAL)
+_search_cache = TTLCache(ARXIV_CACHE_TTL, ARXIV_CACHE_SIZE)
 
 
 def _build_search_query(query: str) -> str:
@@ -68,7 +123,49 @@ def _build_search_query(query: str) -> str:
     return search_query
 
 
-def query_arxiv(query: str, max_results: int = 5) -> List[Dict]:
+def _text(entry, tag: str) -> Optional[str]:
+    el = entry.find(ATOM + tag)
+    return el.text if el is not None else None
+
+
+def _parse_entry(entry) -> Dict:
+    title = (_text(entry, 'title') or '').strip()
+    summary = (_text(entry, 'summary') or '').strip()
+    pdf_url = None
+    for link in entry.findall(ATOM + 'link'):
+        if link.attrib.get('type') == 'application/pdf' or link.attrib.get('title') == 'pdf':
+            pdf_url = link.attrib.get('href')
+    if not pdf_url:
+        id_tag = (_text(entry, 'id') or '').strip()
+        pdf_url = id_tag.replace('abs','pdf') + '.pdf'
+    authors = [a.find(ATOM + 'name').text for a in entry.findall(ATOM + 'author')]
+    pub_date = _text(entry, 'published')
+    return {'id': _text(entry, 'id'), 'title': title, 'summary': summary, 'pdf_url': pdf_url, 'authors': authors, 'published': pub_date}
+
+
+def _fetch_entries(url: str) -> List[Dict]:
+    """GET the feed and parse <entry> elements as the bytes arrive instead of building the whole tree."""
+    _rate_limiter.wait()
+    entries = []
+    parser = ET.XMLPullParser(events=('end',))
+    with _get_session().get(url, timeout=ARXIV_TIMEOUT, stream=True) as resp:
+        resp.raise_for_status()
+        for chunk in resp.iter_content(chunk_size=16384):
+            parser.feed(chunk)
+            for _, elem in parser.read_events():
+                if elem.tag == ATOM + 'entry':
+                    entries.append(_parse_entry(elem))
+                    elem.clear()
+    parser.close()
+    return entries
+
+
+def query_arxiv(query: str, max_results: int = 5, base_url: Optional[str] = None) -> List[Dict]:
+    """
+    Search arXiv and return the max_results entries most relevant to query.
+    Raw feed results are cached for ARXIV_CACHE_TTL seconds per search_query;
+    base_url overrides ARXIV_BASE_URL (e.g. a local stand-in feed server).
+    """
     # Build a proper search query that prioritizes title matches
     search_query = _build_search_query(query)
 
@@ -79,30 +176,21 @@ def query_arxiv(query: str, max_results: int = 5) -> List[Dict]:
         'sortBy': 'relevance',  # Sort by relevance instead of default (submittedDate)
         'sortOrder': 'descending'
     }
-    url = ARXIV_BASE + '?' + urlencode(params)
-    print(f"[arXiv] Query URL: {url}")
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    root = ET.fromstring(resp.text)
-    ns = {'atom':'http://www.w3.org/2005/Atom'}
-    entries = []
-    for entry in root.findall('atom:entry', ns):
-        title = entry.find('atom:title', ns).text.strip() if entry.find('atom:title', ns) is not None else ''
-        summary = entry.find('atom:summary', ns).text.strip() if entry.find('atom:summary', ns) is not None else ''
-        pdf_url = None
-        for link in entry.findall('atom:link', ns):
-            if link.attrib.get('type') == 'application/pdf' or link.attrib.get('title') == 'pdf':
-                pdf_url = link.attrib.get('href')
-        if not pdf_url:
-            id_tag = entry.find('atom:id', ns).text.strip()
-            pdf_url = id_tag.replace('abs','pdf') + '.pdf'
-        authors = [a.find('atom:name', ns).text for a in entry.findall('atom:author', ns)]
-        pub_date = entry.find('atom:published', ns).text if entry.find('atom:published', ns) is not None else None
-        entries.append({'id': entry.find('atom:id', ns).text, 'title': title, 'summary': summary, 'pdf_url': pdf_url, 'authors': authors, 'published': pub_date})
-        time.sleep(0.1)
-
-    # Re-rank entries by title relevance to the original query
-    entries = _rerank_by_relevance(entries, query, max_results)
+    base = base_url or ARXIV_BASE
+    key = (base, search_query, params['max_results'])
+    entries = _search_cache.get(key)
+    if entries is not None:
+        METRICS.inc('rc_arxiv_requests_total', help='arXiv searches by result-cache outcome', cache='hit')
+        print(f"[arXiv] Cache hit: {search_query}")
+    else:
+        METRICS.inc('rc_arxiv_requests_total', help='arXiv searches by result-cache outcome', cache='miss')
+        url = base + '?' + urlencode(params)
+        print(f"[arXiv] Query URL: {url}")
+        entries = _fetch_entries(url)
+        _search_cache.put(key, entries)
+
+    # Re-rank entries by title relevance to the original query (copies: the cached list stays untouched)
+    entries = _rerank_by_relevance([dict(e, authors=list(e['authors'])) for e in entries], query, max_results)
 
     return entries
 
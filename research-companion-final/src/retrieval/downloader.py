@@ -1,15 +1,149 @@
-import requests, os, hashlib
+import requests, os, hashlib, threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import fcntl
+except ImportError:   # Windows: no cross-process lock, single-flight stays per process
+    fcntl = None
+
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '4'))      # concurrent transfers for batches / prefetch
+DOWNLOAD_TIMEOUT = float(os.getenv('DOWNLOAD_TIMEOUT', '60'))
+# read size starts small (fast first bytes, small files) and doubles up to the max on long transfers
+DOWNLOAD_MIN_BUFFER = int(os.getenv('DOWNLOAD_MIN_BUFFER', str(64 * 1024)))
+DOWNLOAD_MAX_BUFFER = int(os.getenv('DOWNLOAD_MAX_BUFFER', str(1024 * 1024)))
+
+_session: Optional[requests.Session] = None
+_pool: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_inflight: Dict[str, Future] = {}   # dest path -> transfer in progress
+
+
+def _get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                s = requests.Session()
+                retry = Retry(total=3, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504),
+                              allowed_methods=frozenset(['GET']))
+                adapter = HTTPAdapter(pool_connections=DOWNLOAD_WORKERS, pool_maxsize=DOWNLOAD_WORKERS,
+                                      max_retries=retry)
+                s.mount('http://', adapter)
+                s.mount('https://', adapter)
+                _session = s
+    return _session
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=max(1, DOWNLOAD_WORKERS), thread_name_prefix='download')
+    return _pool
+
+
+def local_pdf_path(url: str, dest_dir: str) -> str:
+    h = hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]
+    return os.path.join(dest_dir, f"{h}.pdf")
+
+
+def _transfer(url: str, dest: str):
+    """
+    _inflight only dedupes within this process; the .part file is only touched while holding
+    an exclusive lock on dest + '.lock', so another worker process fetching the same URL waits
+    and then finds dest in place instead of appending to the same .part.
+    """
+    if fcntl is None:
+        return _transfer_part(url, dest)
+    with open(dest + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            if not os.path.exists(dest):
+                _transfer_part(url, dest)
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _transfer_part(url: str, dest: str):
+    """
+    Stream url into dest + '.part', resuming a partial file with a Range request,
+    and rename into place only once the body is complete.
+    """
+    part = dest + '.part'
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    headers = {'Range': f'bytes={offset}-'} if offset else {}
+    with _get_session().get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers) as r:
+        if offset and r.status_code == 416:
+            # nothing left to send: the previous attempt got the whole body but died before the rename
+            os.replace(part, dest)
+            return
+        r.raise_for_status()
+        if r.status_code != 206:
+            offset = 0   # server ignored the Range header; start over
+        expected = r.headers.get('Content-Length')
+        expected = offset + int(expected) if expected is not None and 'Content-Encoding' not in r.headers else None
+        size = offset
+        buf = DOWNLOAD_MIN_BUFFER
+        with open(part, 'ab' if offset else 'wb') as f:
+            while True:
+                chunk = r.raw.read(buf, decode_content=True)
+                if not chunk:
+                    break
+                f.write(chunk)
+                size += len(chunk)
+                if len(chunk) == buf:
+                    buf = min(buf * 2, DOWNLOAD_MAX_BUFFER)
+    if expected is not None and size != expected:
+        # keep the .part file; the next attempt resumes from here
+        raise IOError(f"incomplete download: {size}/{expected} bytes from {url}")
+    os.replace(part, dest)
+
+
 def download_pdf(url: str, dest_dir: str):
+    """
+    Download url into dest_dir (file name derived from the URL) and return the path.
+    A finished file is reused; concurrent calls for the same URL share one transfer.
+    """
     os.makedirs(dest_dir, exist_ok=True)
-    h = hashlib.sha1(url.encode('utf-8')).hexdigest()[:10]
-    local_name = f"{h}.pdf"
-    dest = os.path.join(dest_dir, local_name)
+    dest = local_pdf_path(url, dest_dir)
     if os.path.exists(dest):
         return dest
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(dest, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+    with _lock:
+        fut = _inflight.get(dest)
+        owner = fut is None
+        if owner:
+            fut = _inflight[dest] = Future()
+    if not owner:
+        return fut.result()
+    try:
+        _transfer(url, dest)
+        fut.set_result(dest)
+    except BaseException as e:
+        fut.set_exception(e)
+        raise
+    finally:
+        with _lock:
+            _inflight.pop(dest, None)
     return dest
+
+
+def prefetch_pdfs(urls: List[str], dest_dir: str) -> List[Future]:
+    """Start downloads in the background; a later download_pdf() for the same URL joins the transfer."""
+    pool = _get_pool()
+    return [pool.submit(download_pdf, url, dest_dir) for url in urls]
+
+
+def download_pdfs(urls: List[str], dest_dir: str) -> List[Optional[str]]:
+    """Download a batch concurrently. Returns paths in input order; None where a download failed."""
+    paths: List[Optional[str]] = []
+    for url, fut in zip(urls, prefetch_pdfs(urls, dest_dir)):
+        try:
+            paths.append(fut.result())
+        except Exception as e:
+            print("❌ PDF download failed:", url, e)
+            paths.append(None)
+    return paths
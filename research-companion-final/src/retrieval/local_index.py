@@ -0,0 +1,294 @@
+"""
+Local retrieval index over papers the pipeline has already processed.
+
+Every chunk (plus one title/summary document per paper) becomes a hashing-trick
+TF-IDF vector: terms are hashed into LOCAL_INDEX_FEATURES buckets, term weights are
+(1 + ln tf) normalised per document, and IDF is computed from the document-frequency
+array at query time, so adding papers never rewrites existing rows.
+
+On disk (<dir>/), all append-only and read back as memory-mapped arrays:
+    terms.i32 / weights.f32 / entry_doc.i32   one row per (document, hashed term)
+    doc_paper.i32                             paper row of every document
+    df.i32                                    document frequency per hash bucket
+    papers.jsonl                              paper records, in row order; a paper is
+                                              indexed once its line is written. A complete
+                                              record replaces an incomplete one for the same
+                                              paper: the old rows stay on disk but are dead
+    post_*.{i32,f32} + postings.json          inverted index: the first N rows sorted by term
+
+Queries binary-search the postings for their terms and scan only the rows added since
+the postings were last rebuilt; the postings are rebuilt once that tail outgrows
+LOCAL_INDEX_TAIL_FRACTION of the index.
+
+Several worker processes may share one directory: adds hold an exclusive flock on
+<dir>/index.lock and reads a shared one, and each first picks up the papers.jsonl lines
+other processes appended, so row offsets always come from the file rather than from a
+count that another process has already moved past.
+"""
+import os, re, json, math, threading, zlib
+from collections import Counter
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: no cross-process lock, one writing process per index directory
+    fcntl = None
+
+LOCAL_INDEX_FEATURES = int(os.getenv('LOCAL_INDEX_FEATURES', str(1 << 20)))
+LOCAL_INDEX_TAIL_FRACTION = float(os.getenv('LOCAL_INDEX_TAIL_FRACTION', '0.1'))
+_TAIL_MIN_ENTRIES = 50000   # below this a plain scan is as fast as the postings
+
+_TERM_RE = re.compile(r'[a-z][a-z0-9]+|[0-9]+[a-z]+[a-z0-9]*')
+_STOPWORDS = frozenset('''
+    a an and are as at be by for from has have in is it its of on or that the this to was were which with
+    we our us can also been than these those their such using used use based into via not but more most
+'''.split())
+
+
+@lru_cache(maxsize=65536)
+def _feature(term: str) -> int:
+    # crc32 rather than hash(): str hashing is salted per process and the index outlives it
+    return zlib.crc32(term.encode('utf-8')) % LOCAL_INDEX_FEATURES
+
+
+def terms(text: str) -> List[str]:
+    """Lower-cased index terms of text, stopwords removed."""
+    return [t for t in _TERM_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _features(text: str) -> Counter:
+    return Counter(map(_feature, terms(text)))
+
+
+def _paper_text(paper: Dict) -> str:
+    ps = paper.get('paper_summary') or {}
+    parts = [paper.get('title') or '', ps.get('overall_problem') or '']
+    for key in ('overall_methods', 'overall_datasets', 'overall_limitations'):
+        parts.extend(str(x) for x in ps.get(key) or [])
+    return '\n'.join(parts)
+
+
+class LocalIndex:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._papers: List[Dict] = []
+        self._paper_rows: Dict[str, int] = {}    # paper id -> live row
+        self._dead: List[int] = []               # rows replaced by a later record
+        self._arrays = None   # memmaps, reopened whenever the row counts change
+        self._papers_bytes = 0                   # how much of papers.jsonl is registered
+        self._n_docs = self._n_entries = self._n_postings = 0
+        with self._synced(exclusive=True):
+            df_path = self.root / 'df.i32'
+            if not df_path.exists():
+                np.memmap(df_path, dtype=np.int32, mode='w+', shape=(LOCAL_INDEX_FEATURES,)).flush()
+
+    @contextmanager
+    def _synced(self, exclusive: bool = False):
+        """Hold the thread lock and the directory's flock, with other processes' adds picked up."""
+        with self._lock:
+            lock = open(self.root / 'index.lock', 'a') if fcntl is not None else None
+            try:
+                if lock is not None:
+                    fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                self._refresh(repair=exclusive)
+                yield
+            finally:
+                if lock is not None:
+                    lock.close()   # releases the flock
+
+    def _refresh(self, repair: bool = False):
+        """Register papers.jsonl lines added since the last look; repair: cut off a torn last line."""
+        papers_path = self.root / 'papers.jsonl'
+        n_papers = len(self._papers)
+        if papers_path.exists():
+            with open(papers_path, 'r+b' if repair else 'rb') as f:
+                f.seek(self._papers_bytes)
+                for line in f:
+                    try:
+                        self._register(json.loads(line))
+                    except ValueError:
+                        break   # torn last line from an interrupted add
+                    self._papers_bytes += len(line)
+                if repair:
+                    f.truncate(self._papers_bytes)
+        if len(self._papers) != n_papers:
+            last = self._papers[-1]
+            self._n_docs = last['_docs_end']
+            self._n_entries = last['_entries_end']
+            self._arrays = None
+        n_postings = 0
+        try:
+            n = json.loads((self.root / 'postings.json').read_text())['entries']
+            n_postings = n if n <= self._n_entries else 0
+        except (OSError, ValueError, KeyError):
+            pass
+        if n_postings != self._n_postings:
+            self._n_postings = n_postings
+            self._arrays = None
+
+    def _register(self, rec: Dict):
+        if rec.get('replaces') is not None:
+            self._dead.append(rec['replaces'])
+        self._paper_rows[rec['paper']['paper_id']] = len(self._papers)
+        self._papers.append(rec)
+
+    def __len__(self):
+        return len(self._paper_rows)
+
+    def has_paper(self, paper_id: str) -> bool:
+        with self._synced():
+            return paper_id in self._paper_rows
+
+    def wants(self, paper_id: str, complete: bool = True) -> bool:
+        """True if add_paper(paper, complete=complete) would index it: new, or better than what is there."""
+        with self._synced():
+            row = self._paper_rows.get(paper_id)
+            # records from before completeness was tracked count as incomplete
+            return row is None or (complete and not self._papers[row].get('complete', False))
+
+    def add_paper(self, paper: Dict, chunks: Optional[List[Dict]] = None, complete: bool = True) -> bool:
+        """
+        Index one finished paper (the orchestrator's per-paper record) and its chunks.
+        complete: the record comes from the full text with unconstrained LLM summaries. A complete
+        record replaces an incomplete one for the same paper; otherwise returns False if the
+        paper was already indexed.
+        """
+        docs = [('summary', _paper_text(paper))] + [(c.get('section', ''), c.get('text', '')) for c in chunks or []]
+        vectors = []
+        for _, text in docs:
+            counts = _features(text)
+            ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            w = np.fromiter((1.0 + math.log(n) for n in counts.values()), dtype=np.float32, count=len(counts))
+            norm = float(np.linalg.norm(w)) or 1.0
+            vectors.append((ids, w / norm))
+
+        with self._synced(exclusive=True):
+            pid = paper['paper_id']
+            old = self._paper_rows.get(pid)
+            if old is not None and (not complete or self._papers[old].get('complete', False)):
+                return False
+            row = len(self._papers)
+            terms = np.concatenate([ids for ids, _ in vectors])
+            weights = np.concatenate([w for _, w in vectors]).astype(np.float32)
+            entry_doc = np.concatenate([np.full(len(ids), self._n_docs + i, dtype=np.int32)
+                                        for i, (ids, _) in enumerate(vectors)])
+            # a half-written add is ignored on reload: rows past the last paper line are cut off
+            for name, arr, n_before in (('terms.i32', terms, self._n_entries),
+                                        ('weights.f32', weights, self._n_entries),
+                                        ('entry_doc.i32', entry_doc, self._n_entries),
+                                        ('doc_paper.i32', np.full(len(docs), row, dtype=np.int32), self._n_docs)):
+                with open(self.root / name, 'r+b' if (self.root / name).exists() else 'wb') as f:
+                    f.seek(n_before * arr.itemsize)
+                    f.write(arr.tobytes())
+                    f.truncate()
+            df = np.memmap(self.root / 'df.i32', dtype=np.int32, mode='r+', shape=(LOCAL_INDEX_FEATURES,))
+            np.add.at(df, terms, 1)
+            df.flush()
+            del df
+
+            rec = {'paper': paper, 'sections': [s for s, _ in docs], 'complete': complete, 'replaces': old,
+                   '_docs_start': self._n_docs, '_docs_end': self._n_docs + len(docs),
+                   '_entries_end': self._n_entries + len(terms)}
+            line = (json.dumps(rec, ensure_ascii=False, default=str) + '\n').encode('utf-8')
+            with open(self.root / 'papers.jsonl', 'ab') as f:
+                f.write(line)
+            self._register(rec)
+            self._papers_bytes += len(line)
+            self._n_docs, self._n_entries = rec['_docs_end'], rec['_entries_end']
+            self._arrays = None
+            tail = self._n_entries - self._n_postings
+            if tail > _TAIL_MIN_ENTRIES and tail > LOCAL_INDEX_TAIL_FRACTION * self._n_entries:
+                self._rebuild_postings()
+        return True
+
+    def _rebuild_postings(self):
+        """Sort every row by term into the post_* files (called with both locks held, exclusive)."""
+        terms, weights, entry_doc = self._open()[:3]
+        order = np.argsort(terms, kind='stable')
+        # invalidate first: a crash mid-rebuild must not pair an old row count with new files
+        (self.root / 'postings.json').unlink(missing_ok=True)
+        for name, arr in (('post_terms.i32', terms), ('post_weights.f32', weights), ('post_doc.i32', entry_doc)):
+            tmp = self.root / (name + '.tmp')
+            np.asarray(arr)[order].tofile(tmp)
+            os.replace(tmp, self.root / name)
+        # only now do the post_* files cover this many rows
+        (self.root / 'postings.json').write_text(json.dumps({'entries': int(len(order))}))
+        self._n_postings = int(len(order))
+        self._arrays = None
+
+    def _open(self):
+        if self._arrays is None:
+            def mm(name, dtype, n):
+                return np.memmap(self.root / name, dtype=dtype, mode='r', shape=(n,))
+            n, n_post = self._n_entries, self._n_postings
+            self._arrays = (mm('terms.i32', np.int32, n), mm('weights.f32', np.float32, n),
+                            mm('entry_doc.i32', np.int32, n), mm('doc_paper.i32', np.int32, self._n_docs),
+                            mm('df.i32', np.int32, LOCAL_INDEX_FEATURES))
+            if n_post:
+                self._arrays += (mm('post_terms.i32', np.int32, n_post), mm('post_weights.f32', np.float32, n_post),
+                                 mm('post_doc.i32', np.int32, n_post))
+            else:
+                self._arrays += (np.empty(0, np.int32), np.empty(0, np.float32), np.empty(0, np.int32))
+        return self._arrays
+
+    def search(self, query: str, max_results: int = 3, hits_per_paper: int = 3) -> List[Dict]:
+        """
+        Best papers for the query: [{'paper', 'score', 'hits': [{'section', 'score'}]}],
+        a paper scoring as its best document.
+        """
+        q = np.unique(np.fromiter(_features(query).keys(), dtype=np.int32))
+        with self._synced():
+            if not q.size or not self._n_entries:
+                return []
+            terms, weights, entry_doc, doc_paper, df, p_terms, p_weights, p_doc = self._open()
+            n_docs, n_post = self._n_docs, self._n_postings
+            papers = self._papers
+            dead = list(self._dead)
+
+        idf = np.log((n_docs + 1) / (df[q].astype(np.float64) + 1)) + 1.0
+        docs, contribs = [], []
+        # rows covered by the postings: one contiguous slice per query term
+        lo, hi = np.searchsorted(p_terms, q, 'left'), np.searchsorted(p_terms, q, 'right')
+        for i in np.flatnonzero(hi > lo):
+            docs.append(np.asarray(p_doc[lo[i]:hi[i]]))
+            contribs.append(np.asarray(p_weights[lo[i]:hi[i]], dtype=np.float64) * idf[i])
+        # rows added since: scanned
+        tail = np.asarray(terms[n_post:])
+        mask = np.isin(tail, q)
+        docs.append(np.asarray(entry_doc[n_post:])[mask])
+        contribs.append(np.asarray(weights[n_post:])[mask] * idf[np.searchsorted(q, tail[mask])])
+        scores = np.bincount(np.concatenate(docs), weights=np.concatenate(contribs), minlength=n_docs)
+        for row in dead:
+            scores[papers[row]['_docs_start']:papers[row]['_docs_end']] = 0.0
+
+        # enough top documents to fill max_results distinct papers in the common case
+        k = min(n_docs, max(1, max_results) * (hits_per_paper + 2))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        results: Dict[int, Dict] = {}
+        for doc in top:
+            if scores[doc] <= 0:
+                break
+            row = int(doc_paper[doc])
+            rec = papers[row]
+            entry = results.get(row)
+            if entry is None:
+                if len(results) == max_results:
+                    continue
+                entry = results[row] = {'paper': rec['paper'], 'score': round(float(scores[doc]), 4), 'hits': []}
+            if len(entry['hits']) < hits_per_paper:
+                entry['hits'].append({'section': rec['sections'][doc - rec['_docs_start']],
+                                      'score': round(float(scores[doc]), 4)})
+        return list(results.values())
+
+    def stats(self) -> Dict:
+        with self._synced():
+            return {'papers': len(self._paper_rows), 'replaced': len(self._dead), 'documents': self._n_docs,
+                    'entries': self._n_entries, 'unindexed_entries': self._n_entries - self._n_postings}
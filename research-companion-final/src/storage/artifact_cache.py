@@ -0,0 +1,72 @@
+import os, json, hashlib, threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+def fingerprint(*parts) -> str:
+    """Stable short hash of anything JSON-serialisable (prompt text, sizes, model names...)."""
+    blob = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:16]
+
+
+_file_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_file_hash_lock = threading.Lock()
+
+
+def file_sha256(path: str) -> str:
+    """Content hash of a file, memoised on (path, size, mtime) so cached PDFs are hashed once."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _file_hash_lock:
+        if memo_key in _file_hash_memo:
+            return _file_hash_memo[memo_key]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    digest = h.hexdigest()
+    with _file_hash_lock:
+        _file_hash_memo[memo_key] = digest
+    return digest
+
+
+class ArtifactCache:
+    """
+    Per-paper cache of derived pipeline outputs.
+    Entries live at <root>/<doc[:2]>/<doc>/<stage>-<fingerprint>.json where doc is the PDF
+    content hash and fingerprint covers everything that stage (and the stages before it) depends on.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, doc_hash: str, stage: str, fp: str) -> Path:
+        return self.root / doc_hash[:2] / doc_hash / f"{stage}-{fp}.json"
+
+    def get(self, doc_hash: str, stage: str, fp: str, default: Any = None) -> Any:
+        try:
+            value = json.loads(self._path(doc_hash, stage, fp).read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return default
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, doc_hash: str, stage: str, fp: str, value: Any):
+        path = self._path(doc_hash, stage, fp)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+            tmp.write_text(json.dumps(value, ensure_ascii=False, default=str), encoding='utf-8')
+            os.replace(tmp, path)
+        except OSError as e:
+            print("⚠️ Artifact cache write failed:", e)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
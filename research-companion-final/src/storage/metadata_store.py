@@ -0,0 +1,122 @@
+import json, time
+from pathlib import Path
+from typing import Dict, Optional
+
+from sqlalchemy import (create_engine, event, select, func, MetaData, Table, Column,
+                        String, Text, Float)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+_schema = MetaData()
+
+papers_table = Table(
+    'papers', _schema,
+    Column('paper_id', String, primary_key=True),
+    Column('pdf_url', String, index=True),
+    Column('local_path', String),
+    Column('title', Text),
+    Column('updated_at', Float),
+)
+
+# bookkeeping flags (e.g. whether the legacy metadata.json was imported)
+store_meta_table = Table(
+    'store_meta', _schema,
+    Column('key', String, primary_key=True),
+    Column('value', Text),
+)
+
+RECORD_FIELDS = ('local_path', 'title', 'pdf_url')
+
+
+def _row_to_record(row) -> Dict:
+    return {k: row[k] for k in RECORD_FIELDS if row[k] is not None}
+
+
+class MetadataStore:
+    """
+    Transactional paper metadata (paper_id -> local_path/title/pdf_url) in SQLite.
+    WAL mode lets readers proceed while another worker process writes.
+    """
+
+    def __init__(self, db_path: str):
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = str(db_path)
+        self.engine = create_engine(
+            f"sqlite:///{self.db_path}",
+            connect_args={'check_same_thread': False, 'timeout': 30},
+        )
+
+        @event.listens_for(self.engine, 'connect')
+        def _set_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            cur.execute('PRAGMA journal_mode=WAL')
+            cur.execute('PRAGMA synchronous=NORMAL')
+            cur.execute('PRAGMA busy_timeout=30000')
+            cur.close()
+
+        try:
+            _schema.create_all(self.engine)
+        except OperationalError:
+            # another worker created the tables between the existence check and CREATE
+            _schema.create_all(self.engine)
+
+    def get(self, paper_id: str) -> Optional[Dict]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(papers_table).where(papers_table.c.paper_id == paper_id)
+            ).mappings().first()
+        return _row_to_record(row) if row else None
+
+    def get_by_url(self, pdf_url: str) -> Optional[Dict]:
+        if not pdf_url:
+            return None
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(papers_table).where(papers_table.c.pdf_url == pdf_url)
+            ).mappings().first()
+        return _row_to_record(row) if row else None
+
+    def upsert(self, paper_id: str, record: Dict):
+        values = {'paper_id': paper_id, 'updated_at': time.time()}
+        values.update({k: record.get(k) for k in RECORD_FIELDS})
+        stmt = sqlite_insert(papers_table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[papers_table.c.paper_id],
+            set_={k: stmt.excluded[k] for k in values if k != 'paper_id'},
+        )
+        with self.engine.begin() as conn:
+            conn.execute(stmt)
+
+    def count(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(papers_table)).scalar_one()
+
+    def import_json(self, json_path: str) -> int:
+        """
+        One-time import of the legacy {'papers': {pid: {...}}} metadata.json.
+        Rows already in the database win over the file. Returns the number of rows imported.
+        """
+        path = Path(json_path)
+        flag = f"imported:{path.resolve()}"
+        with self.engine.begin() as conn:
+            done = conn.execute(
+                select(store_meta_table.c.value).where(store_meta_table.c.key == flag)
+            ).first()
+            if done:
+                return 0
+            try:
+                papers = json.loads(path.read_text()).get('papers', {})
+            except (OSError, ValueError) as e:
+                print("⚠️ Could not import", path, ":", e)
+                papers = {}
+            now = time.time()
+            rows = [{'paper_id': pid, 'updated_at': now, **{k: (rec or {}).get(k) for k in RECORD_FIELDS}}
+                    for pid, rec in papers.items()]
+            if rows:
+                conn.execute(sqlite_insert(papers_table).on_conflict_do_nothing(), rows)
+            conn.execute(
+                sqlite_insert(store_meta_table).values(key=flag, value=str(len(rows)))
+                .on_conflict_do_nothing()
+            )
+        print(f"✅ Imported {len(rows)} papers from {path} into {self.db_path}")
+        return len(rows)
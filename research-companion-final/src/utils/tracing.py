@@ -0,0 +1,222 @@
+"""
+Lightweight stage tracing and Prometheus-style metrics.
+
+    with span('llm_call', model=...) as sp:
+        ...
+        sp.set(prompt_tokens=123, cache='miss')
+
+Every finished span feeds the process-wide latency histogram / counter for its name.
+Spans are additionally collected into a Trace when one is active for the current
+query (see run_in_trace), which is what the optional per-response breakdown shows.
+With TRACING_ENABLED=0, span() returns a shared no-op object.
+"""
+import os, time, threading, itertools, contextvars
+from typing import Callable, Dict, List, Optional
+
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '1') not in ('0', 'false', 'False')
+
+# seconds; tuned for everything from a cached lookup to a multi-minute query
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('rc_trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('rc_span', default=None)
+_span_ids = itertools.count(1)
+
+
+# ---------- METRICS ----------
+
+def _label_key(labels: Dict) -> tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _fmt_labels(key: tuple, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in items) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[tuple, float]] = {}
+        self._gauges: Dict[str, Dict[tuple, float]] = {}
+        self._hists: Dict[str, Dict[tuple, List]] = {}   # name -> labels -> [bucket counts, sum, count]
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Callable[[], None]] = []
+
+    def inc(self, name: str, value: float = 1.0, help: str = '', **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0.0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def set_gauge(self, name: str, value: float, help: str = '', **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = '', **labels):
+        with self._lock:
+            series = self._hists.setdefault(name, {})
+            key = _label_key(labels)
+            h = series.get(key)
+            if h is None:
+                h = series[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            for i, b in enumerate(LATENCY_BUCKETS):
+                if value <= b:
+                    h[0][i] += 1
+            h[1] += value
+            h[2] += 1
+            if help:
+                self._help.setdefault(name, help)
+
+    def register_collector(self, fn: Callable[[], None]):
+        """fn() is called before every render, typically to refresh gauges from another component."""
+        with self._lock:
+            self._collectors.append(fn)
+
+    def render_prometheus(self) -> str:
+        for fn in list(self._collectors):
+            try:
+                fn()
+            except Exception as e:
+                print("⚠️ metrics collector failed:", e)
+        lines = []
+        with self._lock:
+            for kind, store in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, v in sorted(store[name].items()):
+                        lines.append(f"{name}{_fmt_labels(key)} {v:g}")
+            for name in sorted(self._hists):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (buckets, total, count) in sorted(self._hists[name].items()):
+                    for b, c in zip(LATENCY_BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{_fmt_labels(key, ('le', f'{b:g}'))} {c}")
+                    lines.append(f"{name}_bucket{_fmt_labels(key, ('le', '+Inf'))} {count}")
+                    lines.append(f"{name}_sum{_fmt_labels(key)} {total:.6f}")
+                    lines.append(f"{name}_count{_fmt_labels(key)} {count}")
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+# ---------- SPANS / TRACES ----------
+
+class Trace:
+    """Spans collected for one query; safe to append to from worker threads."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.spans: List[Dict] = []
+
+    def add(self, record: Dict):
+        with self._lock:
+            self.spans.append(record)
+
+    def breakdown(self) -> Dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start'])
+        by_stage: Dict[str, Dict] = {}
+        for s in spans:
+            agg = by_stage.setdefault(s['name'], {'count': 0, 'total_seconds': 0.0})
+            agg['count'] += 1
+            agg['total_seconds'] = round(agg['total_seconds'] + s['duration'], 4)
+        return {'stages': by_stage, 'spans': spans}
+
+
+def _finish(name: str, start: float, duration: float, attrs: Dict, span_id: int, parent: Optional[int]):
+    METRICS.observe('rc_stage_duration_seconds', duration, help='Duration of pipeline stages', stage=name)
+    METRICS.inc('rc_stage_total', help='Completed pipeline stages', stage=name)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add({'id': span_id, 'parent': parent, 'name': name,
+                   'start': round(start - trace.start, 4), 'duration': round(duration, 4), **attrs})
+
+
+class _Span:
+    __slots__ = ('name', 'attrs', 'id', 'parent', 'start', '_token')
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self.id = next(_span_ids)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self._token = _current_span.set(self.id)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        _finish(self.name, self.start, duration, self.attrs, self.id, self.parent)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs):
+    if not TRACING_ENABLED:
+        return _NOOP
+    return _Span(name, attrs)
+
+
+def record(name: str, duration: float, **attrs):
+    """Record an already-measured stage (e.g. from the orchestrator's lap timings)."""
+    if not TRACING_ENABLED:
+        return
+    _finish(name, time.perf_counter() - duration, duration, attrs, next(_span_ids), _current_span.get())
+
+
+def trace_active() -> bool:
+    """True when spans finished here are collected into a trace (attributes are otherwise dropped)."""
+    return TRACING_ENABLED and _current_trace.get() is not None
+
+
+def new_trace() -> Optional[Trace]:
+    return Trace() if TRACING_ENABLED else None
+
+
+def run_in_trace(trace: Optional[Trace], fn, *args, **kwargs):
+    """Run fn in a fresh context where `trace` collects spans. Safe from any thread or generator."""
+    def _inner():
+        _current_trace.set(trace)
+        return fn(*args, **kwargs)
+    return contextvars.copy_context().run(_inner)
+
+
+def bind(fn):
+    """Capture the caller's trace/span context so fn can be submitted to a thread pool."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.run(fn, *args, **kwargs)
@@ -0,0 +1,89 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import src.llm.client as llm_client
+from src.llm.budget import TokenBudget, BudgetExceeded, BUDGET_MIN_OUTPUT
+
+
+def test_reserve_denied_below_min_output():
+    budget = TokenBudget(BUDGET_MIN_OUTPUT + 100)
+    with pytest.raises(BudgetExceeded):
+        budget.reserve(101, 512)   # leaves BUDGET_MIN_OUTPUT - 1 for output
+    assert budget.denied_calls == 1
+    assert budget.reserved == 0 and budget.used == 0
+    assert budget.limited
+
+
+def test_small_max_tokens_is_not_denied():
+    # a call asking for less than BUDGET_MIN_OUTPUT only needs what it asks for
+    budget = TokenBudget(100)
+    assert budget.reserve(50, 10) == 10
+    assert not budget.limited
+
+
+def test_parent_limit_caps_child():
+    root = TokenBudget(1000)
+    a, b = root.child('a'), root.child('b')   # each sees the full 1000 at creation
+    assert a.limit == b.limit == 1000
+    allowed = a.reserve(600, 100)
+    a.record(600 + allowed, 600, 100)
+    # b's own limit would allow 512 more, the shared parent only 1000 - 700 - 100
+    assert b.reserve(100, 512) == 200
+    assert b.capped_calls == 1 and root.capped_calls == 1 and a.capped_calls == 0
+    assert b.limited and not a.limited
+    assert root.reserved == 300
+
+
+def test_record_charges_every_enclosing_scope():
+    root = TokenBudget(1000)
+    paper = root.child('papers', 0.5).split(['p0'])[0]
+    allowed = paper.reserve(100, 50)
+    paper.record(100 + allowed, 100, 30)
+    for scope in (paper, paper.parent, root):
+        assert (scope.used, scope.reserved, scope.calls) == (130, 0, 1)
+    assert root.remaining() == 870
+
+
+def test_cached_calls_cost_nothing():
+    budget = TokenBudget(100)
+    budget.record(0, 0, 0, cached=True)
+    assert budget.cached_calls == 1 and budget.calls == 0 and budget.used == 0
+
+
+def test_reservation_released_when_call_raises(monkeypatch):
+    def failing_call(prompt, max_tokens=512, temperature=0.0):
+        raise RuntimeError('provider down')
+
+    monkeypatch.setattr(llm_client, 'GEMINI_KEY', 'test')
+    monkeypatch.setattr(llm_client, 'call_gemini', failing_call)
+    # reservation accounting only: keep tiktoken (and its encoding download) out of it
+    monkeypatch.setattr(llm_client, 'count_tokens', lambda text, memo=False: len(text.split()))
+    budget = TokenBudget(5000)
+    with pytest.raises(RuntimeError):
+        llm_client.call_llm('summarize this chunk', max_tokens=200, use_cache=False, budget=budget)
+    assert budget.reserved == 0
+    assert budget.calls == 1 and budget.output_tokens == 0
+    assert budget.used == budget.prompt_tokens == 3
+
+
+def test_unspent_paper_tokens_flow_to_corpus():
+    root = TokenBudget(1000)
+    p0, p1 = root.child('papers', 0.8).split(['p0', 'p1'])
+    assert p0.limit == p1.limit == 400
+    allowed = p0.reserve(80, 20)
+    p0.record(80 + allowed, 80, 20)
+    # p1 spent nothing; the corpus gets everything the papers left, not just the 20% held back
+    corpus = root.child('corpus')
+    assert corpus.limit == 900
+
+
+def test_trim_marks_scope_limited():
+    root = TokenBudget(1000)
+    chunks = root.child('chunks')
+    chunks.split(['c0'])[0].note_trimmed()
+    assert chunks.limited and root.limited
+    assert chunks.report()['trimmed_calls'] == 1